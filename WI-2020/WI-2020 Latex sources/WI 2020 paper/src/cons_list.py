@@ -0,0 +1,288 @@
+from __future__ import annotations
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Union
+from weakref import WeakValueDictionary, ref
+
+from logic_variables import PyValue, Structure, Term, Var, ensure_is_logic_variable, trail, unify, unify_pairs
+
+"""
+A persistent list for pylog: O(1) cons, structure sharing, and fast membership of ground elements.
+
+A ConsList is a Prolog-style list cell, a Structure with functor '.' and args (Head, Tail), or
+the empty list (functor '[]', no args). So ConsLists unify as Prolog lists do. L.cons(X) makes
+a new cell in front of L. L is unchanged and shared.
+
+Each cell also keeps
+  o its length,
+  o a jump pointer (as in Myers' random-access lists) to a cell further down the list, so that
+    the cell of any length, and so L[i], is reached in O(log n) steps, and
+  o a pointer to the nearest cell, itself or below, whose head isn't indexed.
+The heads that are PyValues with fixed values are indexed, per run. A value is fixed if it was
+set before the outermost trail mark: backtracking can't undo it. (A PyValue bound since may be
+unbound again. Its cell is on the open chain, with those whose heads are Vars or Structures.)
+A run is a chain of cells, each consed onto the one before, built on a cell of another run
+(or on nothing). A cons extends its tail's run unless a live cell is already consed onto that
+tail there. Then it starts a new run.
+So each run holds at most one live cell of each length, and L's cells are those of its run no
+longer than L, then those of the run below no longer than the cell it's built on, and so on.
+A run holds its cells weakly, and a value's entry goes when its last cell does.
+So L.contains(x) checks L's cells with head x, and only the non-indexed cells one by one.
+
+cons stores its head's trail end. (As in Prolog, where backtracking past a binding discards
+the cells built since, a cell built while a Var is bound belongs to that binding.)
+"""
+
+
+class Run:
+  """ A chain of cells, each consed onto the one before, built on below. """
+
+  __slots__ = ('below', 'cells', 'occurrences', '__weakref__')
+
+  def __init__(self, below: Optional[ConsList]):
+    self.below = below
+    # {length: the live cell of that length}
+    self.cells = WeakValueDictionary( )
+    # {PyValue value: {length: a weak reference to the cell of that length whose head it is}}
+    self.occurrences: Dict[Hashable, Dict[int, ref]] = {}
+
+  def add(self, cell: ConsList, key: Optional[Hashable]):
+    """ Add cell, whose head's index key is key (None if its head isn't indexed). """
+    (length, run) = (cell.length, ref(self))
+    self.cells[length] = cell
+    if key is None: return
+
+    def drop(cell_ref: ref):
+      # Called when the cell goes. (The closure must not refer to the cell, or to the run.)
+      if run( ) is not None:
+        run( ).drop(key, length, cell_ref)
+
+    self.occurrences.setdefault(key, {})[length] = ref(cell, drop)
+
+  def drop(self, key: Hashable, length: int, cell_ref: ref):
+    """ Forget the (dead) cell cell_ref refers to. Forget key if that was its last cell. """
+    refs = self.occurrences.get(key, {})
+    if refs.get(length) is cell_ref:
+      del refs[length]
+      if not refs:
+        del self.occurrences[key]
+
+
+class ConsList(Structure):
+
+  __slots__ = ('length', 'jump', 'open', 'run')
+
+  def __init__(self, items: Iterable = ()):
+    """ The list of items. """
+    items = list(items)
+    if not items:
+      self.link(None, None)
+      return
+    tail = nil
+    for item in reversed(items[1:]):
+      tail = tail.cons(item)
+    self.link(items[0], tail)
+
+  def __add__(self, other: Union[ConsList, Iterable]) -> ConsList:
+    """ self's elements in front of other's. O(len(self)). other is shared. """
+    result = other if isinstance(other, ConsList) else ConsList(other)
+    for item in reversed(list(self)):
+      result = result.cons(item)
+    return result
+
+  def __getitem__(self, key: Union[int, slice]):
+    """ L[i] in O(log n). L[i:] is shared. """
+    if isinstance(key, slice):
+      if key.start is not None and key.stop is None and key.step is None and 0 <= key.start <= self.length:
+        return self.cell_of_length(self.length - key.start)
+      return ConsList(list(self)[key])
+    if not 0 <= key < self.length:
+      raise IndexError(f'ConsList index {key} out of range')
+    return self.cell_of_length(self.length - key).args[0]
+
+  def __iter__(self) -> Iterator[Term]:
+    return (cell.args[0] for cell in self.cells( ))
+
+  def __len__(self) -> int:
+    return self.length
+
+  def __str__(self):
+    return f'[{self.values_string(self)}]'
+
+  def candidates(self, key: Hashable) -> List[ConsList]:
+    """ The cells, front to back, whose heads might equal a PyValue with index key key. """
+    cells = []
+    (run, length) = (self.run, self.length)
+    while True:
+      # The cells of a run no longer than this list's cell in it are this list's.
+      for cell_ref in list(run.occurrences.get(key, {}).values( )):
+        cell = cell_ref( )
+        if cell is not None and cell.length <= length:
+          cells.append(cell)
+      if run.below is None: break
+      (run, length) = (run.below.run, run.below.length)
+    open_cell = self.open
+    while open_cell is not None:
+      cells.append(open_cell)
+      open_cell = open_cell.args[1].open
+    return sorted(cells, key=lambda cell: -cell.length)
+
+  def cell_of_length(self, length: int) -> ConsList:
+    """ The cell of the given length (<= len(self)) in this list. """
+    cell = self
+    while cell.length != length:
+      cell = cell.jump if cell.jump.length >= length else cell.args[1]
+    return cell
+
+  def cells(self) -> Iterator[ConsList]:
+    """ The non-empty cells, front to back. """
+    cell = self
+    while cell.length:
+      yield cell
+      cell = cell.args[1]
+
+  def cons(self, Head: Any) -> ConsList:
+    """ [Head | self] in O(1). """
+    cell = Structure.__new__(ConsList)
+    cell.link(Head, self)
+    return cell
+
+  def contains(self, x: Any) -> bool:
+    """ Whether x is equal (==) to an element. If x is ground, only the candidates are compared. """
+    X = ensure_is_logic_variable(x).trail_end( )
+    key = ConsList.index_key(X)
+    return any(X == cell.args[0] for cell in (self.cells( ) if key is None else self.candidates(key)))
+
+  def head(self) -> Term:
+    return self.args[0]
+
+  @staticmethod
+  def fixed_key(T: Term) -> Optional[Hashable]:
+    """ The index key of a trail end if it can't change: its value, if that was set before the outermost trail mark. """
+    key = ConsList.index_key(T)
+    # An interned PyValue's value is set when it is made.
+    if key is None or T.interned_key is not None or not trail.active: return key
+    bound_since = any(obj is T and attribute == '_py_value' for (obj, attribute, _) in trail.entries)
+    return None if bound_since else key
+
+  @staticmethod
+  def index_key(T: Term) -> Optional[Hashable]:
+    """ The index key of a trail end: its value if it's an instantiated PyValue. """
+    return T.get_py_value( ) if isinstance(T, PyValue) else None
+
+  def link(self, Head: Optional[Any], Tail: Optional[ConsList]):
+    """ Make self [Head | Tail], or the empty list if Tail is None. """
+    Term.__init__(self)
+    if Tail is None:
+      (self.functor, self.args, self.length, self.jump, self.open) = ('[]', (), 0, self, None)
+      self.run = Run(None)
+      return
+    Head = ensure_is_logic_variable(Head).trail_end( )
+    (self.functor, self.args, self.length) = ('.', (Head, Tail), Tail.length + 1)
+    (jump_1, jump_2) = (Tail.jump, Tail.jump.jump)
+    self.jump = jump_2 if Tail.length - jump_1.length == jump_1.length - jump_2.length else Tail
+    key = ConsList.fixed_key(Head)
+    self.open = self if key is None else Tail.open
+    # Extend Tail's run, unless a live cell is already consed onto Tail in it.
+    self.run = Tail.run if Tail.run.cells.get(self.length) is None else Run(Tail)
+    self.run.add(self, key)
+
+  def member(self, X: Any):
+    """
+    As Prolog's member(X, self): unify X with each element in turn. If X is ground, only the
+    elements that might be equal to it are tried: the indexed cells with its value and the others.
+    """
+    X = ensure_is_logic_variable(X)
+    key = ConsList.index_key(X.trail_end( ))
+    if key is None:
+      for Element in list(self):
+        yield from unify(X, Element)
+      return
+    for cell in self.candidates(key):
+      yield from unify(X, cell.args[0])
+
+  def reversed(self) -> ConsList:
+    result = nil
+    for item in self:
+      result = result.cons(item)
+    return result
+
+  def tail(self) -> ConsList:
+    return self.args[1]
+
+
+nil = ConsList( )
+
+
+def is_contiguous_in(Items: Sequence, Xs: Sequence):
+  """ Unify Items with each run of len(Items) consecutive elements of Xs in turn. """
+  n = len(Items)
+  if isinstance(Xs, ConsList):
+    cell = Xs
+    while cell.length >= n:
+      yield from unify_pairs(list(zip(Items, cell)))
+      cell = cell.args[1]
+  else:
+    for i in range(len(Xs) - n + 1):
+      yield from unify_pairs([(Items[k], Xs[i + k]) for k in range(n)])
+
+
+def member(X: Any, Xs: Iterable):
+  """ Unify X with each element of Xs in turn. Indexed if Xs is a ConsList. """
+  if isinstance(Xs, ConsList):
+    yield from Xs.member(X)
+  else:
+    for Element in list(Xs):
+      yield from unify(X, Element)
+
+
+if __name__ == '__main__':
+  from time import perf_counter
+
+  L = ConsList([1, 2, 3])
+  (L_1, L_2) = (L.cons(0), L.cons('a'))
+  print(f'\nL: {L}; L.cons(0): {L_1}; L.cons("a"): {L_2}; they share L: {L_1.tail( ) is L_2.tail( ) is L}')
+  print(f'L_1[2]: {L_1[2]}; L_1[1:]: {L_1[1:]}; L_1.reversed( ): {L_1.reversed( )}; L + [4, 5]: {L + [4, 5]}')
+  print(f'2 in L_1: {L_1.contains(2)}; 0 in L_2: {L_2.contains(0)}')
+  X = Var( )
+  print(f'member(X, L_2): {[str(X) for _ in member(X, L_2)]}')
+  (A, B) = (Var( ), Var( ))
+  print(f'is_contiguous_in([A, B], L_1): {[(str(A), str(B)) for _ in is_contiguous_in([A, B], L_1)]}')
+  (Head, Tail) = (Var( ), Var( ))
+  for _ in unify(Structure( ('.', Head, Tail) ), L_1):
+    print(f'[Head | Tail] = {L_1}: Head = {Head}; Tail = {Tail}')
+
+  def transversal(sets: List[List], so_far: ConsList, Answer: Var):
+    """ transversal_yield_lv (transversals.py) with a ConsList for so_far. """
+    if not sets:
+      yield from unify(so_far.reversed( ), Answer)
+    else:
+      [S, *Ss] = sets
+      X = Var( )
+      for _ in member(X, S):
+        if not so_far.contains(X):
+          yield from transversal(Ss, so_far.cons(X), Answer)
+
+  def transversal_copying(sets: List[List], so_far: List, Answer: Var):
+    """ The same, with so_far a list, copied at each step, and searched by unifying with each element. """
+    if not sets:
+      yield from unify(ConsList(reversed(so_far)), Answer)
+    else:
+      [S, *Ss] = sets
+      X = Var( )
+      for _ in member(X, S):
+        if not any(True for _ in member(X, so_far)):
+          yield from transversal_copying(Ss, [X] + so_far, Answer)
+
+  Answer = Var( )
+  answers = [str(Answer) for _ in transversal([[1, 2, 3], [2, 4], [1]], nil, Answer)]
+  print(f'\ntransversal([[1, 2, 3], [2, 4], [1]], nil, Answer): Answer in {answers}')
+
+  # Set i is [i, i-1, ..., 0]. Each element tried is checked against the i chosen so far.
+  n = 300
+  sets = [list(range(i, -1, -1)) for i in range(n)]
+  for (name, search, empty) in [('ConsList', transversal, nil), ('copied list', transversal_copying, [])]:
+    start = perf_counter( )
+    Answer = Var( )
+    for _ in search(sets, empty, Answer):
+      print(f'{name:>12}: a transversal of {n} sets in {(perf_counter( ) - start) * 1000:.0f} ms: '
+            f'{Answer[0]}, {Answer[1]}, ..., {Answer[n - 1]}')
+      break
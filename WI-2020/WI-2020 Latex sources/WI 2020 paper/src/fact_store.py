@@ -0,0 +1,189 @@
+from __future__ import annotations
+from heapq import merge
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+from logic_variables import PyValue, Structure, Term, Var, ensure_is_logic_variable, trail, unify
+
+"""
+An indexed sequence of facts (Structures) for member lookups.
+
+member(Item, Facts) tries to unify Item with each fact in turn: a full unify and undo per fact.
+A FactStore indexes its facts, as Prolog systems do, on their functor and arity and on one
+argument (the first, by default). member(Item) then tries only the facts that might unify
+with Item, in their original order.
+
+The index key of an argument is
+  o (PyValue, its value)              for an instantiated PyValue,
+  o (Structure, functor, arity)       for a Structure (its functor and arity never change), or
+  o None                              for a Var or an uninstantiated PyValue: it may still be bound.
+Two args with different (non-None) keys can't unify. A fact whose key is None when it is
+added is kept on an "open" list. Its key may be different at each lookup, as Vars are bound
+and unbound, so it is looked up then.
+A binding made before the outermost trail mark can never be undone. So a Var (or PyValue) bound
+then is indexed by what it was bound to. One bound since may be unbound: its fact is open.
+"""
+
+
+# (functor, arity)
+Functor_Key = Tuple[Hashable, int]
+
+
+class FactStore:
+
+  def __init__(self, facts: Iterable[Any] = (), arg_index: Optional[int] = 0):
+    """ arg_index is the index of the argument to index on. If None, index only on functor and arity. """
+    self.arg_index = arg_index
+    self.facts: List[Term] = []
+    # {functor key: the indices of the facts with that functor and arity}
+    self.by_functor: Dict[Functor_Key, List[int]] = {}
+    # {(functor key, arg key): the indices of the facts with that functor, arity, and (fixed) arg key}
+    self.by_arg: Dict[Tuple[Functor_Key, Hashable], List[int]] = {}
+    # {functor key: the indices of the facts with that functor and arity whose arg key may change}
+    self.open_args: Dict[Functor_Key, List[int]] = {}
+    # The indices of the facts whose functor may change, i.e., that aren't (yet) Structures.
+    self.open: List[int] = []
+    # The number of facts tried, i.e., unified with, by member.
+    self.tries = 0
+    self.add_all(facts)
+
+  def __iter__(self) -> Iterator[Term]:
+    return iter(self.facts)
+
+  def __len__(self) -> int:
+    return len(self.facts)
+
+  def add(self, fact: Any):
+    """ Add fact at the end. """
+    self.add_all([fact])
+
+  def add_all(self, facts: Iterable[Any]):
+    """ Add facts at the end, in order. The trail is read at most once for all of them. """
+    # The attributes' values before the outermost trail mark, filled in by fixed_end if it needs them.
+    before: Dict[Tuple[int, str], Any] = {}
+    for fact in facts:
+      fact = ensure_is_logic_variable(fact)
+      i = len(self.facts)
+      self.facts.append(fact)
+      fixed = FactStore.fixed_end(fact, before)
+      if not isinstance(fixed, Structure):
+        self.open.append(i)
+        continue
+      functor_key = FactStore.functor_key(fixed)
+      self.by_functor.setdefault(functor_key, []).append(i)
+      if self.arg_index is None or self.arg_index >= len(fixed.args): continue
+      arg = fixed.args[self.arg_index]
+      fixed_arg = FactStore.fixed_end(arg, before)
+      arg_key = None if fixed_arg is None else FactStore.arg_key(fixed_arg)
+      if arg_key is None:
+        self.open_args.setdefault(functor_key, []).append(i)
+      else:
+        self.by_arg.setdefault((functor_key, arg_key), []).append(i)
+
+  @staticmethod
+  def arg_key(arg: Term) -> Optional[Hashable]:
+    """ arg's index key (see above). arg should be a trail end. """
+    if isinstance(arg, PyValue):
+      return (PyValue, arg.get_py_value( )) if arg.is_instantiated( ) else None
+    if isinstance(arg, Structure):
+      return (Structure, arg.functor, len(arg.args))
+    return None
+
+  def candidates(self, Item: Any) -> Iterator[Term]:
+    """ Generate, in order, the facts that might unify with Item now. """
+    Item = ensure_is_logic_variable(Item).trail_end( )
+    if not isinstance(Item, Structure):
+      yield from self.facts
+      return
+    functor_key = FactStore.functor_key(Item)
+    arg_key = None
+    if self.arg_index is not None and self.arg_index < len(Item.args):
+      arg_key = FactStore.arg_key(Item.args[self.arg_index].trail_end( ))
+    if arg_key is None:
+      indices = merge(self.by_functor.get(functor_key, []), self.open)
+    else:
+      indices = merge(self.by_arg.get((functor_key, arg_key), []),
+                      self.open_args.get(functor_key, []), self.open)
+    facts = self.facts
+    for i in indices:
+      # The facts on the open lists are checked against their current keys.
+      if arg_key is None or self.might_match(facts[i], functor_key, arg_key):
+        yield facts[i]
+
+  @staticmethod
+  def fixed_end(T: Term, before: Dict[Tuple[int, str], Any]) -> Optional[Term]:
+    """
+    T's trail end as it was before the outermost trail mark, or None if that was a Var or an
+    uninstantiated PyValue. before is {(id(obj), attribute): its value then} for those set since.
+    Only the bindings made since the mark can be undone. Structures and interned PyValues never
+    change. For anything else, before is filled in from the trail, once, if it is empty.
+    """
+    if isinstance(T, Structure) or isinstance(T, PyValue) and T.interned_key is not None: return T
+    if trail.entries and not before:
+      before.update(((id(obj), attribute), old_value) for (obj, attribute, old_value) in reversed(trail.entries))
+    while isinstance(T, Var):
+      T = before.get((id(T), 'trail_next'), T.trail_next)
+      if T is None: return None
+    if isinstance(T, PyValue) and before.get((id(T), '_py_value'), T.get_py_value( )) is None: return None
+    return T
+
+  @staticmethod
+  def functor_key(structure: Structure) -> Functor_Key:
+    return (structure.functor, len(structure.args))
+
+  def member(self, Item: Any):
+    """ As member(Item, facts), but only the candidates are tried. """
+    for fact in self.candidates(Item):
+      self.tries += 1
+      yield from unify(Item, fact)
+
+  def might_match(self, fact: Term, functor_key: Functor_Key, arg_key: Hashable) -> bool:
+    """ Whether fact's current functor and arg keys don't rule out functor_key and arg_key. """
+    fact = fact.trail_end( )
+    if not isinstance(fact, Structure): return True
+    if FactStore.functor_key(fact) != functor_key: return False
+    current = FactStore.arg_key(fact.args[self.arg_index].trail_end( ))
+    return current is None or current == arg_key
+
+
+if __name__ == '__main__':
+  from time import perf_counter
+  from logic_variables import Var, n_Vars
+
+  def member(Item, Facts):
+    """ The unindexed member: try every fact. """
+    for Fact in Facts:
+      yield from unify(Item, Fact)
+
+  # Facts person(name, city). Some of the cities are Vars.
+  Cities = n_Vars(3)
+  people = [Structure( ('person', f'p{i}', Cities[i] if i < 3 else f'city{i % 100}') ) for i in range(5_000)]
+  store = FactStore(people)
+
+  City = Var( )
+  for _ in store.member(Structure( ('person', 'p4321', City) )):
+    print(f'\nperson(p4321, City): City = {City}; facts tried: {store.tries}')
+
+  # Indexed on the second argument. The facts with Var cities are on the open list. They are
+  # checked against their current keys, as the Vars are bound and unbound.
+  by_city = FactStore(people, arg_index=1)
+
+  def tried(query):
+    before = by_city.tries
+    answers = sum(1 for _ in by_city.member(query))
+    return f'{answers} answers; {by_city.tries - before} facts tried'
+
+  Query = Structure( ('person', Var( ), 'city21') )
+  for _ in unify(Cities[0], 'city99'):
+    print(f'With p0\'s city bound to city99, person(_, city21): {tried(Query)}.')
+  print(f'After backtracking, person(_, city21): {tried(Query)}.')
+
+  # Indexed vs. not indexed.
+  by_city.tries = 0
+  for (name, lookup) in [('member', lambda Item: member(Item, people)), ('FactStore.member', by_city.member)]:
+    start = perf_counter( )
+    count = 0
+    for c in range(100):
+      for _ in lookup(Structure( ('person', Var( ), f'city{c}') )):
+        count += 1
+    print(f'{name:>16}: 100 person(_, city) queries: {count} answers in {(perf_counter( ) - start) * 1000:.0f} ms.')
+  print(f'FactStore.member tried {by_city.tries} facts (of {len(people) * 100} for member).')
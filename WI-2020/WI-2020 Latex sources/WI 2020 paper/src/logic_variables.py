@@ -3,6 +3,7 @@ from functools import wraps
 from inspect import isgeneratorfunction
 from numbers import Number
 from typing import Any, Iterable, List, Optional, Sequence, Sized, Tuple, Union
+from weakref import ref
 
 """
 Developed by Ian Piumarta as the "unify" library (http://www.ritsumei.ac.jp/~piumarta/pl/src/unify.py) for a
@@ -45,6 +46,44 @@ def eot(f):
   return eot_wrapper_gen if isgeneratorfunction(f) else eot_wrapper_non_gen
 
 
+class Trail:
+  """
+  The undo log for bindings. set( ) records an attribute's old value before changing it.
+  unify marks the trail before it binds and undoes back to the mark on backtracking. That also
+  undoes the path compression done since the mark, which may depend on the binding.
+  With no mark active, nothing can be undone, so nothing is recorded.
+  """
+
+  def __init__(self):
+    self.entries: List[Tuple[Any, str, Any]] = []
+    self.active = 0
+
+  def commit(self):
+    """ End the latest mark without undoing. With no mark left, nothing can be undone. """
+    self.active -= 1
+    if not self.active:
+      self.entries.clear( )
+
+  def mark(self) -> int:
+    self.active += 1
+    return len(self.entries)
+
+  def set(self, obj, attribute: str, value):
+    if self.active:
+      self.entries.append((obj, attribute, getattr(obj, attribute)))
+    setattr(obj, attribute, value)
+
+  def undo_to(self, mark: int):
+    entries = self.entries
+    while len(entries) > mark:
+      (obj, attribute, old_value) = entries.pop()
+      setattr(obj, attribute, old_value)
+    self.active -= 1
+
+
+trail = Trail()
+
+
 class Term:
   """
 
@@ -65,11 +104,15 @@ class Term:
                                                                                PyList      PyTuple
   """
 
+  # interned_key is the key under which the Term is interned, or None if it isn't.
+  __slots__ = ('term_id', 'interned_key')
+
   term_count = 0
 
   def __init__(self):
     Term.term_count += 1
     self.term_id = self.term_count
+    self.interned_key = None
 
   # @eot Can't use decorators on dunder methods without doing this:
   # (https://stackoverflow.com/questions/55550300/python-how-to-decorate-a-special-dunder-method).
@@ -108,22 +151,95 @@ class Term:
     return self
 
 
+# {type: whether its values are immutable}, for the non-container types seen so far.
+immutable_types = {}
+
+
 def is_immutable(x):
-  return (isinstance(x, (Number, str, bool, type(None))) or
-          isinstance(x, (frozenset, tuple)) and all(is_immutable(c) for c in x))
+  if isinstance(x, (frozenset, tuple)):
+    return all(is_immutable(c) for c in x)
+  x_type = type(x)
+  immutable = immutable_types.get(x_type)
+  if immutable is None:
+    immutable = immutable_types[x_type] = isinstance(x, (Number, str, bool, type(None)))
+  return immutable
+
+
+def value_key(x) -> Optional[Tuple]:
+  """
+  x, with the type of each value in it: (int, 1) for 1, and (tuple, ((int, 1), (float, 2.0))) for (1, 2.0).
+  So equal values of different types, e.g., 1, 1.0 and True, have different keys, even inside tuples
+  and frozensets. None if x is mutable.
+  """
+  if isinstance(x, (frozenset, tuple)):
+    keys = tuple(map(value_key, x))
+    if None in keys: return None
+    return (type(x), frozenset(keys) if isinstance(x, frozenset) else keys)
+  return (type(x), x) if is_immutable(x) else None
+
+
+class Intern_Table(dict):
+  """
+  {key: a weak reference to the Term interned under it}. Looking a key up is a plain dict lookup.
+  (A WeakValueDictionary's lookups run in Python.) The entry of a Term no longer in use stays until
+  its key is reused or the table is swept, which happens when it has doubled since the last sweep.
+  """
+
+  def __init__(self):
+    super( ).__init__( )
+    self.sweep_size = 1024
+
+  def add(self, key, term: Term):
+    term.interned_key = key
+    self[key] = ref(term)
+    if len(self) > self.sweep_size:
+      for dead_key in [dead_key for (dead_key, term_ref) in self.items( ) if term_ref( ) is None]:
+        del self[dead_key]
+      self.sweep_size = max(2 * len(self), 1024)
 
 
 class PyValue(Term):
 
-  """ A wrapper class for integers, strings, and other immutable Python value. """
+  """
+  A wrapper class for integers, strings, and other immutable Python value.
+
+  PyValue(x) for an x other than None is interned: equal values (of the same types, all the way
+  down) share one PyValue. (An uninstantiated PyValue may later be given a value by unify. So each
+  is new.) The table holds them weakly: a PyValue no longer in use is dropped.
+  """
+
+  __slots__ = ('_py_value', '__weakref__')
+
+  # {value_key(py_value): its PyValue}
+  interned = Intern_Table( )
+
+  def __new__(cls, py_value: Optional[str, Number] = None):
+    if py_value is None:
+      return super( ).__new__(cls)
+    # Checks that py_value is immutable before anything hashes it.
+    py_type = type(py_value)
+    key = (py_type, py_value) if immutable_types.get(py_type) else value_key(py_value)
+    assert key is not None, f"Only immutable values are allowed as PyValues. {py_value} is mutable."
+    if cls is not PyValue:
+      return super( ).__new__(cls)
+    pv_ref = PyValue.interned.get(key)
+    pv = None if pv_ref is None else pv_ref( )
+    if pv is None:
+      pv = super( ).__new__(cls)
+      pv._py_value = py_value
+      Term.__init__(pv)
+      PyValue.interned.add(key, pv)
+    return pv
 
   def __init__(self, py_value: Optional[str, Number] = None ):
-    assert is_immutable(py_value), f"Only immutable values are allowed as PyValues. {py_value} is mutable."
+    # An interned PyValue is set up by __new__, which also checks that py_value is immutable.
+    if hasattr(self, '_py_value'): return
     self._py_value = py_value
     super( ).__init__( )
 
   def __eq__(self, other: Term) -> bool:
     other_eot = other.trail_end()
+    if other_eot is self: return self._py_value is not None
     return (isinstance(other_eot, PyValue) and
             self.get_py_value() == other_eot.get_py_value() and
             # Don't need to test both.
@@ -156,8 +272,37 @@ class Structure(Term):
   """
   self.functor is the functor
   self.args is a tuple of args
+
+  Like PyValues, ground Structures--all of whose args are interned PyValues or ground Structures--
+  are interned, weakly, as PyValues are. (A Structure holds its args. So while it is alive, the
+  ids in its key are those of live objects.)
   """
+
+  __slots__ = ('functor', 'args', '__weakref__')
+
+  # {(value_key(functor), the ids of its (interned) args): the ground Structure}
+  interned = Intern_Table( )
+
+  def __new__(cls, *args, **kwargs):
+    # Subclasses (e.g., StructureItem) take other args and are never interned.
+    if cls is not Structure:
+      return super( ).__new__(cls)
+    term = args[0] if args else kwargs.get('term', (None, ()))
+    args = tuple(map(ensure_is_logic_variable, term[1:]))
+    key = Structure.ground_key(term[0], args)
+    structure_ref = None if key is None else Structure.interned.get(key)
+    structure = None if structure_ref is None else structure_ref( )
+    if structure is None:
+      structure = super( ).__new__(cls)
+      (structure.functor, structure.args) = (term[0], args)
+      Term.__init__(structure)
+      if key is not None:
+        Structure.interned.add(key, structure)
+    return structure
+
   def __init__(self, term: Tuple = ( None, () ) ):
+    # A Structure (as opposed to a subclass) has been set up by __new__.
+    if hasattr(self, 'args'): return
     self.functor = term[0]
     self.args = tuple(map(ensure_is_logic_variable, term[1:]))
     super().__init__()
@@ -183,6 +328,17 @@ class Structure(Term):
     py_value_args = [arg.get_py_value() for arg in self.args]
     return Structure( (self.functor, *py_value_args) )
 
+  @staticmethod
+  def ground_key(functor, args: Tuple[Term, ...]) -> Optional[Tuple]:
+    """
+    The key under which Structure( (functor, *args) ) is interned, or None if it isn't ground
+    (or its functor is mutable). An interned arg knows its own key. So the args aren't looked up.
+    """
+    if None in [arg.interned_key for arg in args]: return None
+    functor_type = type(functor)
+    functor_key = (functor_type, functor) if immutable_types.get(functor_type) else value_key(functor)
+    return None if functor_key is None else (functor_key, tuple(map(id, args)))
+
   def is_instantiated(self) -> bool:
     """ A Structure is instantiated if all its args are. """
     args_are_instantiated = all(arg.is_instantiated() for arg in self.args)
@@ -224,9 +380,14 @@ class Var(Term):
   A logic variable
   """
 
+  __slots__ = ('trail_next', 'rank')
+
   def __init__(self):
     # self.trail_next points to the next element on the trail, if any.
+    # The trails form a union-find forest: the trail end is the root.
     self.trail_next = None
+    # An upper bound on the height of the tree of Vars rooted here. (Union by rank.)
+    self.rank = 0
     super().__init__()
 
   def __getattr__(self, item):
@@ -260,11 +421,32 @@ class Var(Term):
     Trail_End_Var = self.trail_end( )
     return not isinstance(Trail_End_Var, Var) and Trail_End_Var.is_instantiated()
 
+  @staticmethod
+  def link(Left: Term, Right: Term):
+    """
+    Left and Right are trail ends, at least one a Var. Make one the other's trail_next.
+    A Var points to a non-Var. Of two Vars, the one with the lower rank points to the other.
+    """
+    if not isinstance(Left, Var) or isinstance(Right, Var) and Left.rank > Right.rank:
+      (Left, Right) = (Right, Left)
+    if isinstance(Right, Var) and Left.rank == Right.rank:
+      trail.set(Right, 'rank', Right.rank + 1)
+    trail.set(Left, 'trail_next', Right)
+
   def trail_end(self):
     """
     return: the Term, whatever it is, at the end of this Var's unification trail.
+    Walk the trail iteratively. Then point each Var on it directly at the end (path compression).
     """
-    return self.trail_next.trail_end( ) if self._has_trail_next( ) else self
+    end = self
+    while isinstance(end, Var) and end.trail_next is not None:
+      end = end.trail_next
+    v = self
+    while v.trail_next is not None and v.trail_next is not end:
+      next_v = v.trail_next
+      trail.set(v, 'trail_next', end)
+      v = next_v
+    return end
 
 
 # @staticmethod
@@ -293,8 +475,6 @@ def n_Vars(n: int) -> List[Var]:
   return [Var( ) for _ in range(n)]
 
 
-# noinspection PyProtectedMember
-@eot
 def unify(Left: Any, Right: Any):
   """
   Unify two logic Terms.
@@ -307,76 +487,85 @@ def unify(Left: Any, Right: Any):
   o a non-Var, in which case the value of all preceding variables is the value of that non-Var, or
   o a Var (which is not linked to any further element), in which case, all variables on the trail
     are unified but do not (yet) have a value.
+
+  The work is done by unify_all, without recursion. unify yields once if it succeeds.
+  """
+  yield from unify_pairs([(Left, Right)])
+
+
+def unify_all(pairs: List[Tuple[Any, Any]]) -> bool:
   """
+  Unify each pair of terms. Return whether they all unify. The bindings are made through the
+  trail, so the caller, having marked it, can undo them--whether or not unify_all succeeded.
+
+  Instead of recursing into Structures, push their pairs of args on a work stack. So long
+  lists and deep Structures take time linear in their size and no Python stack.
+  """
+  # The stack holds the pairs still to be unified, in reverse order.
+  stack = list(reversed(pairs))
+  while stack:
+    (Left, Right) = stack.pop( )
+    # Make sure both Left and Right are logic variables. This allows us to call, e.g, unify(X, 'abc').
+    # ensure_is_logic_variable will wrap 'abc' in a PyValue. Then take their trail ends.
+    (Left, Right) = (ensure_is_logic_variable(Left).trail_end( ), ensure_is_logic_variable(Right).trail_end( ))
+
+    # The same (unbound) Var or the same term: already unified.
+    if Left is Right:
+      continue
+
+    # Case 1. Both PyValues. If both are instantiated, they must be equal. If exactly one is,
+    # "assign" it's value to the other. Two uninstantiated PyValues don't unify.
+    if isinstance(Left, PyValue) and isinstance(Right, PyValue):
+      if Left.is_instantiated( ) and Right.is_instantiated( ):
+        if Left.get_py_value( ) != Right.get_py_value( ): return False
+      elif Left.is_instantiated( ) or Right.is_instantiated( ):
+        (assignedTo, assignedFrom) = (Left, Right) if Right.is_instantiated( ) else (Right, Left)
+        trail.set(assignedTo, '_py_value', assignedFrom.get_py_value( ))
+      else:
+        return False
+
+    # Case 2. Both Structures. They can be unified if
+    # (a) they have the same functor and
+    # (b) their arguments can be unified.
+    elif isinstance(Left, Structure) and isinstance(Right, Structure):
+      if Left.functor != Right.functor or len(Left.args) != len(Right.args): return False
+      stack.extend(reversed(list(zip(Left.args, Right.args))))
+
+    # Case 3. At least one is a Var: the end of its trail. Make the other an extension of its trail.
+    elif isinstance(Left, Var) or isinstance(Right, Var):
+      Var.link(Left, Right)
+
+    else:
+      return False
+  return True
+
 
-  # Make sure both Left and Right are logic variables. This allows us to call, e.g, unify(X, 'abc').
-  # ensure_is_logic_variable will wrap 'abc' in a PyValue.
-  (Left, Right) = map(ensure_is_logic_variable, (Left, Right))
-
-  # If the trail_ends are equal, either because they have the same py_value or Structure or
-  # because they are the same (unbound) Var, do nothing. They are already unified.
-  # yield to indicate unification success. If Left and Right are both
-  # uninstantiated PyValues, Left != Right. (See PyValue.__eq__.)
-  if Left == Right:
-    yield
-
-  # The rest consists of special cases: both PyValues, both Structures, at least one Var.
-
-  # Case 1. Both PyValues and exactly one is instantiated.
-  # "Assign" it's value to the other. This is similar to (but simpler than)
-  # how we handle two Var's. But instead of building a trail, we "assign"
-  # one value to the other.
-  elif isinstance(Left, PyValue) and isinstance(Right, PyValue) and \
-       (not Left.is_instantiated( ) or not Right.is_instantiated( )) and \
-       (Left.is_instantiated( ) or Right.is_instantiated( )):
-    (assignedTo, assignedFrom) = (Left, Right) if Right.is_instantiated( ) else (Right, Left)
-    assignedTo._set_py_value(assignedFrom.get_py_value( ))
-    yield
-    # See discussion in unify below for why we do this.
-    assignedTo._set_py_value(None)
-    # :
-    # # If they are both PyValues, treat specially.
-    # yield from unify_PyValues(Left, Right)
-    
-  # Case 2. Both  Structures. They can be unified if
-  # (a) they have the same functor and
-  # (b) their arguments can be unified.
-  elif isinstance(Left, Structure) and isinstance(Right, Structure) and Left.functor == Right.functor:
-    yield from unify_sequences(Left.args, Right.args)
-
-  # Case 3. At least one is a Var. Since we use @eot, it's the end of its trail.
-  # Make the other an extension of its trail.
-  # (If both are Vars, it makes no functional difference which extends which.)
-  elif isinstance(Left, Var) or isinstance(Right, Var):
-    (pointsFrom, pointsTo) = (Left, Right) if isinstance(Left, Var) else (Right, Left)
-    pointsFrom.trail_next = pointsTo
-    yield
-    # All yields create a context in which more of the program is executed--like
-    # the body of a while-loop or a for-loop. A "next()" request asks for alternatives.
-    # But there is only one functional way to do unification. So on "backup," unlink the
-    # two and exit without a further yield, i.e., fail.
-
-    # This is fundamental! It's what makes it possible for a Var to become un-unified outside
-    # the context in which it was unified, e.g., unifying a Var with (successive) members
-    # of a list. The first successful unification must be undone before the second can occur.
-    pointsFrom.trail_next = None
-
-    
 def unify_pairs(tuples: List[Tuple[Any, Any]]):
   """ Apply unify to pairs of terms. """
-  # If no more tuples, we are done.
-  if not tuples:
-    yield
-  else:
-    # Get the first tuple from the tuples list.
-    [(Left, Right), *restOfTuples] = tuples
-    # If they unify, go on to the rest of the tuples list.
-    for _ in unify(Left, Right):
-      yield from unify_pairs(restOfTuples)
-    # The preceding is equivalent to the following.
-    # for _ in forall([lambda: unify(Left, Right),
-    #                  lambda: unify_pairs(restOfTuples)]):
-    #   yield
+  mark = trail.mark( )
+  # All yields create a context in which more of the program is executed--like
+  # the body of a while-loop or a for-loop. A "next()" request asks for alternatives.
+  # But there is only one functional way to do unification. So on "backup," undo the
+  # bindings and exit without a further yield, i.e., fail.
+
+  # This is fundamental! It's what makes it possible for a Var to become un-unified outside
+  # the context in which it was unified, e.g., unifying a Var with (successive) members
+  # of a list. The first successful unification must be undone before the second can occur.
+  # Undoing to the mark also undoes any path compression that depended on these bindings.
+  try:
+    if unify_all(tuples):
+      yield
+  except GeneratorExit:
+    # The caller stopped early, e.g., by breaking out of a for-loop over unify( ). Keep the
+    # bindings, as Prolog's once/1 does. An enclosing unify's undo still undoes them.
+    trail.commit( )
+    raise
+  except BaseException:
+    # Anything else, raised by unify_all or thrown in at the yield: undo the bindings made so far
+    # and release the mark. Otherwise the trail would stay marked, recording every later binding.
+    trail.undo_to(mark)
+    raise
+  trail.undo_to(mark)
 
 
 def unify_sequences(seq_1: Sequence, seq_2: Sequence):
@@ -384,16 +573,7 @@ def unify_sequences(seq_1: Sequence, seq_2: Sequence):
   # The two sequences must be the same length.
   if len(seq_1) != len(seq_2):
     return
-
-  # If they are both empty, we are done.
-  if len(seq_1) == 0:
-    yield
-
-  else:
-    # Unify the two first elements. If successful go on to the rest.
-    # Note that slice notation is supported.
-    for _ in unify(seq_1[0], seq_2[0]):
-      yield from unify_sequences(seq_1[1:], seq_2[1:])
+  yield from unify_pairs([(seq_1[i], seq_2[i]) for i in range(len(seq_1))])
 
 
 if __name__ == '__main__':
@@ -560,3 +740,73 @@ if __name__ == '__main__':
   
   End of sixth test.
   """
+
+  # A long chain of unifications. Each unify nests inside the previous one, as in a search.
+  from time import perf_counter
+
+  def unify_chain(Vars, i=0):
+    if i == len(Vars) - 1:
+      yield
+    else:
+      for _ in unify(Vars[i], Vars[i + 1]):
+        yield from unify_chain(Vars, i + 1)
+
+  Vs = n_Vars(500)
+  for _ in unify_chain(Vs):
+    for _ in unify(Vs[0], 'end'):
+      start = perf_counter( )
+      all_end = all(V.get_py_value( ) == 'end' for V in Vs for _ in range(20))
+      print(f'\n500 unified Vars, bound to "end": all "end": {all_end}. 10,000 lookups: '
+            f'{(perf_counter( ) - start) * 1000:.1f} ms.')
+    print(f'After backtracking out of unify(Vs[0], "end"): Vs[0]: {Vs[0]}; same as Vs[-1]: {Vs[0] == Vs[-1]}')
+  print(f'After backtracking out of the chain: Vs[0]: {Vs[0]}, Vs[1]: {Vs[1]}. '
+        f'Trail entries left: {len(trail.entries)}')
+  print('\nEnd of seventh test.')
+
+  # Long lists and deep Structures: unified without recursion.
+  Xs = n_Vars(100_000)
+  start = perf_counter( )
+  for _ in unify_sequences(Xs, list(range(100_000))):
+    print(f'\nunify_sequences of 100,000 Vars with 100,000 ints: {(perf_counter( ) - start) * 1000:.0f} ms. '
+          f'Xs[-1]: {Xs[-1]}')
+  print(f'After backtracking: Xs[-1]: {Xs[-1] if not Xs[-1].is_instantiated( ) else "still bound!"}')
+
+  def nested(depth, leaf):
+    term = leaf
+    for _ in range(depth):
+      term = Structure( ('s', term) )
+    return term
+
+  (Leaf, Deep_1) = (Var( ), nested(10_000, 'leaf'))
+  Deep_2 = nested(10_000, Leaf)
+  for _ in unify(Deep_1, Deep_2):
+    print(f'Unified two Structures 10,000 deep. The innermost Var: {Leaf}')
+  print('\nEnd of eighth test.')
+
+
+  # Ground terms are interned: equal ones are the same object, and == on them is an identity test.
+  print(f'\nPyValue(3) is PyValue(3): {PyValue(3) is PyValue(3)}; '
+        f'PyValue(3) is PyValue(3.0): {PyValue(3) is PyValue(3.0)}; '
+        f'PyValue((1,)) is PyValue((True,)): {PyValue((1,)) is PyValue((True,))}')
+  (T_1, T_2) = [Structure( ('t', 1, ('a', 'b'), Structure( ('u', 2) )) ) for _ in range(2)]
+  print(f'{T_1} is {T_2}: {T_1 is T_2}. With a Var arg: {Structure( ("t", Var( )) ) is Structure( ("t", Var( )) )}')
+  start = perf_counter( )
+  (Big_1, Big_2) = (nested(10_000, 'leaf'), nested(10_000, 'leaf'))
+  built = perf_counter( ) - start
+  start = perf_counter( )
+  same = all(Big_1 == Big_2 for _ in range(10_000))
+  compared = perf_counter( ) - start
+  print(f'Built two ground Structures 10,000 deep in {built * 1000:.0f} ms. '
+        f'They are the same object: {Big_1 is Big_2}. 10,000 comparisons: {same}, {compared * 1000:.1f} ms.')
+  # Constructing a term looks it up in the table. When nothing keeps it, it is dropped and built again.
+  start = perf_counter( )
+  for i in range(200_000):
+    PyValue(i % 100)
+  built_pvs = perf_counter( ) - start
+  start = perf_counter( )
+  for i in range(100_000):
+    Structure( ('f', i % 100, 'a', ('b', 'c')) )
+  built_structures = perf_counter( ) - start
+  print(f'Constructed 200,000 PyValues in {built_pvs * 1000:.0f} ms and '
+        f'100,000 Structures f(i, a, (b, c)) in {built_structures * 1000:.0f} ms.')
+  print('\nEnd of ninth test.')
@@ -0,0 +1,288 @@
+from __future__ import annotations
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from logic_variables import PyValue, Structure, Term, Var, ensure_is_logic_variable, unify_pairs
+
+"""
+Tabling (memoized resolution) for pylog predicates.
+
+A predicate is a generator function that yields once for each way it can bind its args.
+Decorating one with @tabled memoizes its answers per call pattern: its args with their Vars
+renamed in order of occurrence, so path(a, X) and path(a, Y) are the same call (variants).
+Each call pattern has a table of the distinct answers (the args, renamed the same way, as bound
+at each yield). A call whose table is complete just unifies its args with each answer.
+
+Otherwise, the table is evaluated: the predicate is run on a fresh copy of the call's args,
+and the answers are collected. A call to a table being evaluated (as in left recursion) gets
+only the answers found so far. So a table may depend on itself, or on an enclosing table.
+As in SLG resolution, the tables that depend on each other are completed together. The
+outermost of them (the leader) re-runs itself and each of the others, once per round, until a
+round adds no answers to any of them. Then all of them are complete. Until then, a call to one
+of them also gets only the answers found so far, and makes the caller depend on the leader.
+
+Each predicate keeps at most maxsize tables. Past that, the least recently used complete
+table is dropped. Tables are dropped only between top-level calls, never during an evaluation:
+a table dropped then would be evaluated again, perhaps over and over.
+"""
+
+
+class Table:
+
+  def __init__(self, key: Tuple, predicate: Callable):
+    self.key = key
+    self.predicate = predicate
+    self.answers: List[Tuple] = []
+    self.answer_keys = set()
+    self.complete = False
+    # While the table is being evaluated: its depth on the evaluation stack, and the depth of
+    # the outermost table under evaluation that it depends on (its leader, if it's not its own).
+    self.depth: Optional[int] = None
+    self.link: Optional[int] = None
+    # Whether it is waiting to be completed with its leader.
+    self.pending = False
+    # While it is pending: the table under evaluation that it was last found to depend on.
+    self.depends_on: Optional[Table] = None
+
+  def add_answer(self, answer: Tuple) -> bool:
+    if answer in self.answer_keys: return False
+    self.answer_keys.add(answer)
+    self.answers.append(answer)
+    return True
+
+
+class Tabling:
+  """ The evaluation state, shared by all tabled predicates. """
+
+  # The tables being evaluated, outermost first.
+  stack: List[Table] = []
+  # The tables evaluated but not yet complete, in the order they were first evaluated.
+  # Those from a leader on were all evaluated during its evaluation. They are its component.
+  pending: List[Table] = []
+
+  @staticmethod
+  def answer_count(index: int) -> int:
+    """ The number of answers in the tables pending from index on. """
+    return sum(len(table.answers) for table in Tabling.pending[index:])
+
+  @staticmethod
+  def depend_on(depth: int):
+    """ The table being run depends on the table at depth on the stack. """
+    caller = Tabling.stack[-1]
+    caller.link = min(caller.link, depth)
+
+  @staticmethod
+  def evaluate(table: Table):
+    """
+    Run table's predicate. If table turns out to be a leader, run each of the other tables in its
+    component and then table again, once per round, until a round adds no answers to them.
+    Then complete them all.
+    """
+    table.depth = table.link = depth = len(Tabling.stack)
+    Tabling.stack.append(table)
+    table.pending = True
+    Tabling.pending.append(table)
+    try:
+      Tabling.run(table)
+      index = Tabling.pending.index(table)
+      # If a run finds that table depends on a table under evaluation, its leader will finish table.
+      while table.link == depth:
+        count = Tabling.answer_count(index)
+        # The tables first evaluated in a round are run in the next.
+        for pending in Tabling.pending[index + 1:]:
+          Tabling.rerun(pending)
+        Tabling.run(table)
+        if Tabling.answer_count(index) == count: break
+    except BaseException:
+      # Leave this table, and those evaluated since, incomplete: they will be evaluated again.
+      index = Tabling.pending.index(table)
+      for dropped in Tabling.pending[index:]:
+        dropped.pending = False
+      del Tabling.pending[index:]
+      raise
+    finally:
+      Tabling.stack.pop( )
+      table.depth = None
+    if table.link < depth:
+      table.depends_on = Tabling.stack[table.link]
+      Tabling.depend_on(table.link)
+    else:
+      # A leader: complete it and the tables that depend on it.
+      index = Tabling.pending.index(table)
+      for completed in Tabling.pending[index:]:
+        (completed.complete, completed.pending, completed.depends_on) = (True, False, None)
+      del Tabling.pending[index:]
+
+  @staticmethod
+  def leader_depth(table: Table) -> int:
+    """ The depth of the table under evaluation that pending table depends on, through other tables if need be. """
+    while table.depth is None:
+      table = table.depends_on
+    return table.depth
+
+  @staticmethod
+  def rerun(table: Table):
+    """ Run pending table again, for its leader, on top of the stack. """
+    table.depth = table.link = depth = len(Tabling.stack)
+    Tabling.stack.append(table)
+    try:
+      Tabling.run(table)
+    finally:
+      Tabling.stack.pop( )
+      table.depth = None
+    if table.link < depth:
+      Tabling.depend_on(table.link)
+
+  @staticmethod
+  def run(table: Table):
+    """ Run table's predicate once on a copy of its call pattern, and add the answers to table. """
+    Args = terms_of(table.key)
+    for _ in table.predicate(*Args):
+      table.add_answer(variant_key(Args))
+
+
+def tabled(predicate: Optional[Callable] = None, *, maxsize: Optional[int] = 1024):
+  """
+  Make predicate tabled. Use as @tabled or @tabled(maxsize=n). maxsize=None means no limit.
+  The tabled predicate's tables attribute is its {call pattern: Table}; clear( ) empties it.
+  (A predicate called only from other tabled predicates has its tables trimmed at its next top-level call.)
+  """
+  if predicate is None:
+    return lambda predicate: tabled(predicate, maxsize=maxsize)
+
+  tables: Dict[Tuple, Table] = OrderedDict( )
+
+  @wraps(predicate)
+  def tabled_predicate(*args):
+    key = variant_key(args)
+    table = tables.get(key)
+    if table is None:
+      table = tables[key] = Table(key, predicate)
+    else:
+      tables.move_to_end(key)
+    if not table.complete:
+      if table.depth is not None:
+        # A call to a table being evaluated. The caller depends on it.
+        Tabling.depend_on(table.depth)
+      elif table.pending:
+        # A call to a table waiting for its leader, which will run it again. The caller depends on the leader.
+        Tabling.depend_on(Tabling.leader_depth(table))
+      else:
+        Tabling.evaluate(table)
+    if not Tabling.stack:
+      evict(tables, maxsize)
+    # Answers may be added while they are used (if table is being evaluated).
+    i = 0
+    while i < len(table.answers):
+      yield from unify_pairs(list(zip(args, terms_of(table.answers[i]))))
+      i += 1
+
+  tabled_predicate.tables = tables
+  tabled_predicate.clear = tables.clear
+  return tabled_predicate
+
+
+def evict(tables: Dict[Tuple, Table], maxsize: Optional[int]):
+  """ Drop the least recently used complete tables until there are at most maxsize. """
+  if maxsize is None or len(tables) <= maxsize: return
+  for key in [key for (key, table) in tables.items() if table.complete][:len(tables) - maxsize]:
+    del tables[key]
+
+
+def terms_of(key: Tuple) -> List[Term]:
+  """ The inverse of variant_key: Terms, with fresh Vars, whose variant_key is key. """
+  (terms, Vars) = ([], {})
+  # key is in prefix order. Built from the end, each Structure's args are on top of terms.
+  for entry in reversed(key):
+    if entry[0] is PyValue:
+      terms.append(PyValue(entry[1]))
+    elif entry[0] is Var:
+      terms.append(Vars.setdefault(entry[1], Var( )))
+    else:
+      (_, functor, arity) = entry
+      args = [terms.pop( ) for _ in range(arity)]
+      terms.append(Structure( (functor, *args) ))
+  return terms[::-1]
+
+
+def variant_key(args: Tuple[Any, ...]) -> Tuple[Hashable, ...]:
+  """
+  args, as a tuple in prefix order, with the Vars numbered in order of first occurrence:
+    (PyValue, value) for an instantiated PyValue,
+    (Var, n)  for the nth distinct Var (or uninstantiated PyValue), and
+    (Structure, functor, arity) for a Structure, followed by its args.
+  Two calls (or answers) are variants if their keys are equal.
+  """
+  (key, numbers) = ([], {})
+  stack = list(reversed(args))
+  while stack:
+    T = ensure_is_logic_variable(stack.pop( )).trail_end( )
+    if isinstance(T, Structure):
+      key.append((Structure, T.functor, len(T.args)))
+      stack.extend(reversed(T.args))
+    elif isinstance(T, PyValue) and T.is_instantiated( ):
+      key.append((PyValue, T.get_py_value( )))
+    else:
+      key.append((Var, numbers.setdefault(id(T), len(numbers))))
+  return tuple(key)
+
+
+if __name__ == '__main__':
+  from time import perf_counter
+
+  edges = [('a', 'b'), ('b', 'c'), ('c', 'a'), ('c', 'd')]
+
+  def edge(X, Y):
+    for (x, y) in edges:
+      yield from unify_pairs([(X, x), (Y, y)])
+
+  @tabled
+  def path(X, Y):
+    """ Left recursive, with a cycle in the graph: without tabling, it never returns. """
+    Z = Var( )
+    for _ in path(X, Z):
+      yield from edge(Z, Y)
+    yield from edge(X, Y)
+
+  Y = Var( )
+  print(f'\nedges: {edges}. path(a, Y): Y in {sorted(str(Y) for _ in path("a", Y))}')
+  (X, Y) = (Var( ), Var( ))
+  print(f'path(X, Y): {len([(str(X), str(Y)) for _ in path(X, Y)])} answers. Tables: {len(path.tables)}')
+
+  # A chain of n nodes with two edges from each to the next has 2**n paths from end to end.
+  # Untabled, reach enumerates all of them. Tabled, it finds each answer once per call pattern.
+  n = 14
+  ladder = [(i, i + 1, label) for i in range(n) for label in ('up', 'down')]
+
+  def rung(X, Y):
+    for (x, y, _) in ladder:
+      yield from unify_pairs([(X, x), (Y, y)])
+
+  def make_reach(table: bool):
+    def reach(X, Y):
+      Z = Var( )
+      for _ in rung(X, Z):
+        yield from unify_pairs([(Y, Z)])
+        yield from reach_(Z, Y)
+    # The recursive call is to the tabled version, if there is one.
+    reach_ = tabled(reach, maxsize=None) if table else reach
+    return reach_
+
+  for (name, reach_) in [('untabled', make_reach(False)), ('tabled', make_reach(True))]:
+    Y = Var( )
+    start = perf_counter( )
+    answers = [str(Y) for _ in reach_(0, Y)]
+    print(f'{name:>8} reach(0, Y) in a {n}-node ladder: {len(answers)} answers '
+          f'({len(set(answers))} distinct) in {(perf_counter( ) - start) * 1000:.0f} ms.')
+
+  # The table cap: the least recently used complete tables are dropped.
+  @tabled(maxsize=3)
+  def successor(X, Y):
+    yield from unify_pairs([(Y, X.get_py_value( ) + 1)])
+
+  for i in range(5):
+    for _ in successor(i, Var( )):
+      pass
+  print(f'successor, with maxsize=3, after 5 calls keeps the tables for: '
+        f'{[key[0][1] for key in successor.tables]}')
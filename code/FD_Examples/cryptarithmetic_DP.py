@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+from itertools import permutations
+from time import perf_counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import cryptarithmetic_FD
+from cryptarithmetic_FD import Crypto_FD
+from solver import All_Different, Var_FD
+
+"""
+An alternative to Crypto_FD's propagation-based search: dynamic programming over the columns.
+
+Working from right to left, the state after a column is
+    (the next column, the carry into it, the set of digits used so far,
+     the digits of the letters that appear again in the columns still to come).
+Nothing else about the columns already done can affect the columns still to come.
+So the number of ways to finish from a state is memoized. A failure proven in one
+branch is never re-derived in another branch that reaches the same state.
+
+The columns, carries, and initial domains are taken from a Crypto_FD built by
+cryptarithmetic_FD.set_up (or set_up_puzzle). So the two solvers always solve the same problem.
+"""
+
+
+class Alphametic_DP:
+
+    def __init__(self, crypto_solver: Crypto_FD):
+        columns = crypto_solver.columns
+        # The letters are the vars that must be all different. Refer to them by index.
+        self.letters: List[Var_FD] = sorted({v for col in columns.cols for v in col if v in All_Different.sibs_dict},
+                                            key=lambda v: v.var_name)
+        letter_index = {v: i for (i, v) in enumerate(self.letters)}
+        self.letter_domains = [sorted(v.domain) for v in self.letters]
+
+        # For each column: its letters, (letter, coef) pairs, the constant part of its sum,
+        # its carry-in var, and its carry-out var with that var's coefficient.
+        self.col_letters: List[List[int]] = []
+        self.col_coefs: List[List[Tuple[int, int]]] = []
+        self.col_constants: List[int] = []
+        self.carry_ins: List[Tuple[int, Var_FD]] = []
+        self.carry_outs: List[Tuple[int, Var_FD]] = []
+        for (col_index, (col, col_eq)) in enumerate(zip(columns.cols, columns.col_eqs)):
+            (carry_in, carry_out) = (col[0], columns.carry_out_var(col_index))
+            self.col_letters.append(sorted({letter_index[v] for v in col if v in letter_index}))
+            coefs = {v: coef for (coef, v) in col_eq.terms}
+            self.col_coefs.append([(letter_index[v], coef) for (v, coef) in coefs.items() if v in letter_index])
+            # Vars that are neither letters nor carries, e.g., the zero padding, have a single value.
+            self.col_constants.append(sum(coef * v.value for (v, coef) in coefs.items()
+                                          if v not in letter_index and v is not carry_in and v is not carry_out))
+            self.carry_ins.append((coefs.get(carry_in, 0), carry_in))
+            self.carry_outs.append((coefs.get(carry_out, 0), carry_out))
+
+        # remaining_letters[i]: the letters in column i and the columns to its left, i.e., those still to do.
+        self.remaining_letters = [{l for col in self.col_letters[:i+1] for l in col} for i in range(len(self.col_letters))]
+        self.memo: Dict[Tuple, int] = {}
+        self.states = 0
+
+    def column_extensions(self, col_index, carry, used, assignment: Dict[int, int]) \
+            -> Iterator[Tuple[int, int, Dict[int, int]]]:
+        """
+        Generate (carry_out, used, assignment) for each way to give digits to the
+        still unassigned letters in column col_index that satisfies the column.
+        """
+        unassigned = [l for l in self.col_letters[col_index] if l not in assignment]
+        (carry_in_coef, _) = self.carry_ins[col_index]
+        (carry_out_coef, carry_out_var) = self.carry_outs[col_index]
+        free_digits = {d for l in unassigned for d in self.letter_domains[l] if not used & (1 << d)}
+        for digits in permutations(sorted(free_digits), len(unassigned)):
+            if any(d not in self.letter_domains[l] for (l, d) in zip(unassigned, digits)): continue
+            new_assignment = {**assignment, **dict(zip(unassigned, digits))}
+            total = self.col_constants[col_index] + carry_in_coef * carry + \
+                    sum(coef * new_assignment[l] for (l, coef) in self.col_coefs[col_index])
+            # carry_out_coef * carry_out + total == 0
+            (carry_out, remainder) = divmod(-total, carry_out_coef)
+            if remainder or carry_out not in carry_out_var.domain: continue
+            new_used = used
+            for d in digits:
+                new_used |= 1 << d
+            yield (carry_out, new_used, new_assignment)
+
+    def count_from(self, col_index, carry, used, assignment: Dict[int, int]) -> int:
+        """ The number of ways to complete the columns from col_index leftward. """
+        if col_index < 0: return 1
+        key = (col_index, carry, used, self.relevant_part(col_index, assignment))
+        if key not in self.memo:
+            self.states += 1
+            self.memo[key] = sum(self.count_from(col_index - 1, carry_out, new_used, new_assignment)
+                                 for (carry_out, new_used, new_assignment)
+                                 in self.column_extensions(col_index, carry, used, assignment))
+        return self.memo[key]
+
+    def count_solutions(self) -> int:
+        return sum(self.count_from(len(self.col_letters) - 1, carry, 0, {}) for carry in self.initial_carries())
+
+    def initial_carries(self):
+        (_, carry_in_var) = self.carry_ins[-1]
+        return sorted(carry_in_var.domain)
+
+    def relevant_part(self, col_index, assignment: Dict[int, int]) -> Tuple:
+        """ The part of assignment that column col_index and the columns to its left can see. """
+        remaining = self.remaining_letters[col_index]
+        return tuple(sorted((l, d) for (l, d) in assignment.items() if l in remaining))
+
+    def solutions(self) -> Iterator[Dict[str, int]]:
+        """
+        Generate each solution as a {letter: digit} dictionary. Only states
+        from which the memoized count says a solution exists are entered.
+        """
+        def solutions_from(col_index, carry, used, assignment):
+            if col_index < 0:
+                yield {self.letters[l].var_name: d for (l, d) in sorted(assignment.items())}
+                return
+            for (carry_out, new_used, new_assignment) in self.column_extensions(col_index, carry, used, assignment):
+                if self.count_from(col_index - 1, carry_out, new_used, new_assignment):
+                    yield from solutions_from(col_index - 1, carry_out, new_used, new_assignment)
+
+        for carry in self.initial_carries():
+            yield from solutions_from(len(self.col_letters) - 1, carry, 0, {})
+
+
+def set_up(term_1: str, term_2: str, sum: str) -> Optional[Alphametic_DP]:
+    crypto_solver = cryptarithmetic_FD.set_up(term_1, term_2, sum)
+    return None if crypto_solver is None else Alphametic_DP(crypto_solver)
+
+
+def set_up_puzzle(puzzle: str, base=10, leading_zeros=False) -> Optional[Alphametic_DP]:
+    """ Any puzzle that cryptarithmetic_FD.set_up_puzzle accepts--except a product, which has no columns. """
+    crypto_solver = cryptarithmetic_FD.set_up_puzzle(puzzle, base=base, leading_zeros=leading_zeros)
+    if crypto_solver is not None and crypto_solver.operator == '*':
+        print(f'Not a sum: {puzzle}')
+        return None
+    return None if crypto_solver is None else Alphametic_DP(crypto_solver)
+
+
+if __name__ == '__main__':
+    print(f'{"solver":>10} | {"solutions":>9} | {"nodes/states":>12} | seconds')
+    for (term_1, term_2, sum_word) in [
+        ('SEND', 'MORE', 'MONEY'),
+        ('DONALD', 'GERALD', 'ROBERT'),
+        ('SATURN', 'URANUS', 'PLANETS'),
+        ('POTATO', 'TOMATO', 'PUMPKIN'),
+        ('CROSS', 'ROADS', 'DANGER'),
+        ('AAAAAAAAAAAB', 'BBBBBBBBBBBA', 'CCCCCCCCCCCC'),
+        ('ABCDEFGHIJABCDEFGHIJ', 'JIHGFEDCBAJIHGFEDCBA', 'JJJJJJJJJJJJJJJJJJJJ'),
+        ]:
+        print(f'\n{term_1} + {term_2} = {sum_word}')
+
+        start = perf_counter()
+        crypto_solver = cryptarithmetic_FD.set_up(term_1, term_2, sum_word)
+        fd_solutions = 0
+        for _ in crypto_solver.solve():
+            fd_solutions += 1
+        print(f'{"Crypto_FD":>10} | {fd_solutions:>9} | {crypto_solver.line_no:>12} | {perf_counter() - start:.3f}')
+
+        start = perf_counter()
+        alphametic_dp = set_up(term_1, term_2, sum_word)
+        dp_solutions = alphametic_dp.count_solutions()
+        print(f'{"DP":>10} | {dp_solutions:>9} | {alphametic_dp.states:>12} | {perf_counter() - start:.3f}')
+        if dp_solutions:
+            print(f'First solution: {next(alphametic_dp.solutions())}')
+
+    for (puzzle, base) in [('FORTY + TEN + TEN = SIXTY', 10), ('MONEY - MORE = SEND', 10), ('SEND + MORE = MONEY', 16)]:
+        print(f'\n{puzzle} (base {base})')
+        crypto_solver = cryptarithmetic_FD.set_up_puzzle(puzzle, base=base)
+        fd_solutions = sum(1 for _ in crypto_solver.solve())
+        alphametic_dp = set_up_puzzle(puzzle, base=base)
+        print(f'Crypto_FD: {fd_solutions}; DP: {alphametic_dp.count_solutions()}')
@@ -1,50 +1,52 @@
 from __future__ import annotations
 
+import re
+from heapq import heapify, heappop, heappush
+from itertools import zip_longest
 from math import prod
-from typing import Iterable, List
+from typing import Iterable, List, Optional, Tuple
 
-from solver import All_Different, Const_FD, Solver_FD, Var_FD
+from solver import All_Different, Const_FD, Linear_Eq, Solver_FD, Var_FD
 
 
 class Columns:
 
-    def __init__(self, cols: List[List[Digit_FD]]):
-        # Each col is a list of Digit_FD's
+    def __init__(self, cols: List[List[Digit_FD]], signs: List[int] = None, base=10):
+        # Each col is a list of Digit_FD's: [carry_in, summand digits ..., sum digit].
+        # carry_in is the carry into the column from the column to its right.
+        # signs[i] is +1 or -1 for the i-th summand. By default, all summands are added.
         self.cols = cols
         self.final_carry_out_var = Const_FD({0})
+        signs = signs if signs is not None else [1] * (len(cols[0]) - 2 if cols else 0)
+        # One Linear_Eq per column: carry_in + signed summands == base*carry_out + sum_digit.
+        self.col_eqs = [Linear_Eq([(1, col[0])] + [(sign, d) for (sign, d) in zip(signs, col[1:-1])] +
+                                  [(-base, self.carry_out_var(col_index)), (-1, col[-1])])
+                        for (col_index, col) in enumerate(cols)]
+
+        # An index for smallest_column_summand. col_keys[col_index] caches
+        # (product of the summands' domain sizes, whether any term var is still unpropagated).
+        # A Digit_FD whose domain changes marks the columns it is in as dirty. Only those are recomputed.
+        # col_heap holds (sizes_product, col_index) for the columns that can be chosen. An entry whose
+        # column's key has changed since is stale. It is dropped when it reaches the top.
+        self.col_keys = [None] * len(cols)
+        self.col_heap = []
+        self.dirty_cols = set(range(len(cols)))
+        for (col_index, col) in enumerate(cols):
+            for d in col:
+                if isinstance(d, Digit_FD):
+                    d.columns = self
+                    d.col_indices.add(col_index)
 
     def all_cols_ok(self):
-        return all(self.col_is_ok(col_index) for col_index in range(len(self.cols)))
-
-    def carry_out_domain(self, col_index):
-        return frozenset({0}) if col_index == 0 else self.cols[col_index-1][0].domain
+        return all(col_eq.is_feasible() for col_eq in self.col_eqs)
 
     def carry_out_var(self, col_index):
         return self.final_carry_out_var if col_index == 0 else self.cols[col_index-1][0]
 
-
-    def col_is_ok(self, col_index):
-        ok = self.summands_sum_upper_bound(col_index) >= self.target_lower_bound(col_index) and \
-             self.summands_sum_lower_bound(col_index) <= self.target_upper_bound(col_index)
-        return ok
-
-    def complete_col(self, col_index):
-        if self.col_is_ok(col_index):
-            if self.summands_sum_upper_bound(col_index) == self.summands_sum_lower_bound(col_index):
-                (carry_out_var, sum_dig_var) = (self.carry_out_var(col_index), self.cols[col_index][-1])
-                (carry_out, sum_dig) = divmod(self.summands_sum_upper_bound(col_index), 10)
-                (carry_out_cvar, sum_dig_cvar) = (Const_FD({carry_out}), Const_FD({sum_dig}))
-                yield from Solver_FD.unify_pairs_FD([(carry_out_var, carry_out_cvar), (sum_dig_var, sum_dig_cvar)])
-            else: yield
-
-    def instantiate_problem(self, col_index):
-        # print('in', col_index)
-        # if col_index == 0:
-        #     print(col_index)
-        for _ in self.complete_col(col_index):
-            # print('out', col_index)
-            if col_index == 0: yield
-            else: yield from self.instantiate_problem(col_index - 1)
+    @staticmethod
+    def can_choose(col_key):
+        (sizes_product, has_unpropagated) = col_key
+        return sizes_product > 1 and has_unpropagated
 
     def smallest_column_summand(self):
         """
@@ -52,37 +54,57 @@ class Columns:
         available possibilities among its term vars. Then select
         the var with the smallest domain.
         """
-        def summands_domains_sizes(col):
-            return prod( [len(x.domain) for x in col[:-1]] )
-
-        col_uninstans = [(self.cols[indx], summands_domains_sizes(self.cols[indx]), indx)
-                         for indx in range(len(self.cols)) if summands_domains_sizes(self.cols[indx]) > 1 and
-                                                              any(not d.was_propagated for d in self.cols[indx][1:-1])]
-        (min_col, _, _) = min(col_uninstans, key=lambda cu: (cu[1], cu[2]))
+        self.update_col_heap()
+        col_heap = self.col_heap
+        # Drop the stale entries from the top.
+        while col_heap:
+            (sizes_product, col_index) = col_heap[0]
+            col_key = self.col_keys[col_index]
+            if col_key[0] == sizes_product and Columns.can_choose(col_key): break
+            heappop(col_heap)
+        # Propagation may have settled every column's summands without settling the problem.
+        if not col_heap: return None
+        min_col = self.cols[col_index]
         # col[1:-1]gets the middle elements
         smallest_var = min(min_col[1:-1], key=lambda x: len(x.domain) if len(x.domain) > 1 else float('inf'))
         return smallest_var
 
-    def summands_sum_lower_bound(self, col_index):
-        col = self.cols[col_index]
-        summands_digits = col[:-1]
-        return sum(d.lower_bound for d in summands_digits)
+    def update_col_heap(self):
+        """ Recompute the keys of the dirty columns. Push an entry for each that changed and can be chosen. """
+        for col_index in self.dirty_cols:
+            col = self.cols[col_index]
+            col_key = (prod(d.size for d in col[:-1]), any(not d.was_propagated for d in col[1:-1]))
+            if col_key != self.col_keys[col_index] and Columns.can_choose(col_key):
+                heappush(self.col_heap, (col_key[0], col_index))
+            self.col_keys[col_index] = col_key
+        self.dirty_cols.clear()
+        # Stale entries pile up as domains change back and forth. Rebuild the heap now and then.
+        if len(self.col_heap) > 4 * len(self.cols):
+            self.col_heap = [(col_key[0], col_index) for (col_index, col_key) in enumerate(self.col_keys)
+                             if Columns.can_choose(col_key)]
+            heapify(self.col_heap)
 
-    def summands_sum_upper_bound(self, col_index):
-        col = self.cols[col_index]
-        summands_digits = col[:-1]
-        return sum(d.upper_bound for d in summands_digits)
 
-    def target_lower_bound(self, col_index):
-        col = self.cols[col_index]
-        return min(self.carry_out_domain(col_index))*10 + min(col[-1].domain)
+class Digit_FD(Var_FD):
+    """
+    Keeps its domain's bounds up to date as the domain changes, restoring them on
+    backtracking, so that lower_bound and upper_bound never rescan the domain.
+    """
 
-    def target_upper_bound(self, col_index):
-        col = self.cols[col_index]
-        return max(self.carry_out_domain(col_index))*10 + max(col[-1].domain)
+    digit_chars = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
 
+    def __init__(self, init_domain=None, var_name=None):
+        super().__init__(init_domain, var_name)
+        # Parallel to domain_was_propagated_stack: the bounds to restore on undo_update_domain.
+        self.bounds_stack = []
+        (self._lower_bound, self._upper_bound) = self.domain_bounds(self.domain)
+        # The Columns this Digit_FD is in, if any, and the indices of its columns there.
+        self.columns = None
+        self.col_indices = set()
 
-class Digit_FD(Var_FD):
+    @staticmethod
+    def domain_bounds(domain):
+        return (min(domain), max(domain)) if domain else (None, None)
 
     @staticmethod
     def letters_to_vars(st: Iterable, d: dict) -> List:
@@ -91,12 +113,21 @@ class Digit_FD(Var_FD):
 
     @property
     def lower_bound(self):
-        return min(self.domain)
+        return self._lower_bound
+
+    def mark_columns_dirty(self):
+        if self.columns is not None:
+            self.columns.dirty_cols |= self.col_indices
+
+    @property
+    def size(self):
+        return len(self.domain)
 
     @staticmethod
     def terms_to_number_string(vs) -> str:
-        """  Convert a list of Vars to a string of digits. """
-        digits = "".join((str(v.value) if v.is_instantiated() else '_') for v in vs)
+        """  Convert a list of Vars to a string of digits. Digits above 9 are shown as A, B, .... """
+        digits = "".join((Digit_FD.digit_chars[v.value] if 0 <= v.value < len(Digit_FD.digit_chars) else str(v.value))
+                         if v.is_instantiated() else '_' for v in vs)
         return digits
 
     @staticmethod
@@ -105,38 +136,79 @@ class Digit_FD(Var_FD):
         letters = "".join(v.var_name[0] for v in vs)
         return letters
 
+    def undo_update_domain(self):
+        super().undo_update_domain()
+        (self._lower_bound, self._upper_bound) = self.bounds_stack.pop()
+        self.mark_columns_dirty()
+
+    def update_domain(self, new_domain, was_propagated=False, track_in_stack=True):
+        if track_in_stack:
+            self.bounds_stack.append((self._lower_bound, self._upper_bound))
+            # A tracked update only narrows the domain. So a bound that is still in it is still the bound.
+            self._lower_bound = self._lower_bound if self._lower_bound in new_domain else \
+                                min(new_domain) if new_domain else None
+            self._upper_bound = self._upper_bound if self._upper_bound in new_domain else \
+                                max(new_domain) if new_domain else None
+        else:
+            (self._lower_bound, self._upper_bound) = Digit_FD.domain_bounds(new_domain)
+        super().update_domain(new_domain, was_propagated, track_in_stack)
+        self.mark_columns_dirty()
+
     @property
     def upper_bound(self):
-        return max(self.domain)
+        return self._upper_bound
 
 
 class Crypto_FD(Solver_FD):
+    """
+    An alphametic: signed summands (words) that add up to a sum (word), e.g., SEND + MORE = MONEY
+    or a sum of many words, some of them subtracted. Or, if operator is '*', the product of
+    two words, e.g., TWO * TWO = SQUARE. In either case, in any base.
+    """
 
-    def __init__(self, carries, term_1_vars, term_2_vars, sum_vars, columns, problem_vars, trace):
+    def __init__(self, carries, summands, signs, sum_vars, columns, problem_vars, trace,
+                 word_equation=False, base=10, operator='+'):
         # Store the variables in lists from left to right.
         # Process the columns starting at position len(sum_vars)
         self.col_index = len(sum_vars)
+        self.base = base
         self.carries = carries
-        self.term_1_vars = term_1_vars
-        self.term_2_vars = term_2_vars
+        self.operator = operator
+        self.summands = summands
+        self.signs = signs
         self.sum_vars = sum_vars
-        self.columns = Columns(columns)
-        super().__init__(problem_vars | set(carries), trace=trace)
+        self.columns = Columns(columns, signs, base)
+        if operator == '*':
+            # There are no columns. Instantiate the factors' digits from right to left, alternating
+            # between the factors, so that Product_Eq can settle the product's digits from the right.
+            (factor_1, factor_2) = summands
+            self.var_order = [d for pair in zip_longest(factor_1[::-1], factor_2[::-1]) for d in pair
+                              if d is not None] + sum_vars[::-1]
+            propagators = [Product_Eq(factor_1, factor_2, sum_vars, base)]
+        else:
+            # The column equations see the problem one column at a time. The (optional) word equation,
+            # e.g., 1000*S + 100*E + ... == 10000*M + ..., sees all of it at once.
+            self.var_order = None
+            propagators = self.columns.col_eqs + ([Crypto_FD.word_eq(summands, signs, sum_vars, base)]
+                                                  if word_equation else [])
+        super().__init__(problem_vars | set(carries), propagators=propagators, trace=trace)
 
     def constraints_satisfied(self):
-        return self.columns.all_cols_ok()
+        # Linear_Eq propagates a letter that All_Different narrows to one digit. All_Different is
+        # checked as well, as in Solver_FD's default constraints.
+        return self.columns.all_cols_ok() and All_Different.all_satisfied()
 
     def problem_is_solved(self):
         """ The solution condition for transversals. (But not necessarily all problems.) """
         problem_solved = all(v.is_instantiated() for v in self.vars)
         return problem_solved
 
-    def propagate_consequences(self):
-        yield from self.columns.instantiate_problem(len(self.columns.cols)-1)
-
     def select_var_to_instantiate(self):
+        if self.var_order is not None:
+            return next((v for v in self.var_order if not v.was_propagated), None) or \
+                   super().select_var_to_instantiate()
         nxt_var = self.columns.smallest_column_summand()
-        return nxt_var
+        return nxt_var if nxt_var is not None else super().select_var_to_instantiate()
 
     def state_string(self, solved=True):
         vars_list = sorted(self.vars, key=lambda v: v.var_name)
@@ -148,18 +220,89 @@ class Crypto_FD(Solver_FD):
                       f'==================================================================='
         else:
             domains = ''
-        return f'{"C"*len(self.sum_vars)} -> {Digit_FD.terms_to_number_string(self.carries)}\n' \
-               f'{Crypto_FD.vars_to_letters_and_numbers(self.term_1_vars)}' \
-               f'{Crypto_FD.vars_to_letters_and_numbers(self.term_2_vars)}' \
+        carries = f'{"C"*len(self.carries)} -> {Digit_FD.terms_to_number_string(self.carries)}\n' \
+                  if self.carries else ''
+        # Mark subtracted summands and the second factor of a product.
+        summands = "".join(Crypto_FD.vars_to_letters_and_numbers(summand).rstrip('\n') +
+                           ('   (-)' if sign < 0 else f'   ({self.operator})' if self.operator == '*' and i else '') +
+                           '\n'
+                           for (i, (sign, summand)) in enumerate(zip(self.signs, self.summands)))
+        return f'{carries}' \
+               f'{summands}' \
                f'{"-" * ln_sums}    {"-" * ln_sums}\n' \
                f'{Crypto_FD.vars_to_letters_and_numbers(self.sum_vars)}' \
                f'{domains}'
 
+    @staticmethod
+    def word_eq(summands, signs, sum_vars, base=10):
+        """ The signed sum of the summands == sum as a single Linear_Eq over the letters' place values. """
+        def place_values(vars, sign):
+            return [(sign * base**place, v) for (place, v) in enumerate(reversed(vars))]
+
+        return Linear_Eq([term for (sign, summand) in zip(signs, summands) for term in place_values(summand, sign)] +
+                         place_values(sum_vars, -1))
+
     @staticmethod
     def vars_to_letters_and_numbers(vars):
         return f'{Digit_FD.terms_to_letter_string(vars)} -> {Digit_FD.terms_to_number_string(vars)}\n' \
 
 
+class Product_Eq:
+    """
+    factor_1 * factor_2 == product, where each is a word: a list of Digit_FD's, most significant first.
+
+    Long multiplication has its own carry propagation: the lowest k digits of the product depend only
+    on the lowest k digits of the factors. So once those are known, so are the product's lowest k digits.
+    In addition, the bounds of the words' values must be consistent. And once either factor is fully
+    known, the equation is linear and is handed to Linear_Eq.
+    """
+
+    def __init__(self, factor_1: List[Digit_FD], factor_2: List[Digit_FD], product: List[Digit_FD], base=10):
+        (self.factor_1, self.factor_2, self.product, self.base) = (factor_1, factor_2, product, base)
+
+    def known_low_digits(self, word):
+        """ The number of trailing digits of word that are instantiated. """
+        known = 0
+        for d in reversed(word):
+            if not d.is_instantiated(): break
+            known += 1
+        return known
+
+    def narrow(self):
+        words = (self.factor_1, self.factor_2, self.product)
+        if any(d.is_at_deadend() for word in words for d in word): return
+        ((lo_1, hi_1), (lo_2, hi_2), (lo_p, hi_p)) = (self.word_bounds(word) for word in words)
+        if lo_1 * lo_2 > hi_p or hi_1 * hi_2 < lo_p: return
+
+        # If either factor is known, factor * other_factor - product == 0 is linear.
+        for (factor, other_factor) in [(self.factor_1, self.factor_2), (self.factor_2, self.factor_1)]:
+            if self.known_low_digits(factor) == len(factor):
+                value = self.word_value(factor, len(factor))
+                yield from Linear_Eq(self.place_values(other_factor, value) + self.place_values(self.product, -1)).narrow()
+                return
+
+        # The lowest k digits of the product are those of (lowest k digits of factor_1) * (those of factor_2).
+        k = min(self.known_low_digits(self.factor_1), self.known_low_digits(self.factor_2), len(self.product))
+        low_product = self.word_value(self.factor_1, k) * self.word_value(self.factor_2, k)
+        narrowed = []
+        for (place, d) in enumerate(reversed(self.product[-k:] if k else [])):
+            digit = (low_product // self.base**place) % self.base
+            if not d.is_instantiated() or d.value != digit:
+                narrowed.append((d, Const_FD({digit})))
+        for _ in Solver_FD.unify_pairs_FD(narrowed):
+            yield bool(narrowed)
+
+    def place_values(self, word, multiplier):
+        return [(multiplier * self.base**place, d) for (place, d) in enumerate(reversed(word))]
+
+    def word_bounds(self, word):
+        return (sum(self.base**place * d.lower_bound for (place, d) in enumerate(reversed(word))),
+                sum(self.base**place * d.upper_bound for (place, d) in enumerate(reversed(word))))
+
+    def word_value(self, word, k):
+        """ The value of the lowest k digits of word, which must be instantiated. """
+        return sum(self.base**place * d.value for (place, d) in enumerate(reversed(word[len(word)-k:])))
+
 
 def run_problem(trace=False):
     # See http://bach.istc.kobe-u.ac.jp/llp/crypt.html (and links) for these and many(!) more.
@@ -181,47 +324,117 @@ def run_problem(trace=False):
         print(f'=================')
 
 
-def set_up(term_1: str, term_2: str, sum: str, trace=False):
+def build_crypto_solver(summands: List[Tuple[int, str]], sum: str, operator='+', base=10,
+                        leading_zeros=True, trace=False, word_equation=False) -> Optional[Crypto_FD]:
     """
-    Convert the initial string representation to (uninstantiated) FD_Vars.
-    term_1 and term_2 are the numbers to be added. sum is the sum.
-    zero is 0. It will be replaced by leading blanks.
+    Convert the string representation to (uninstantiated) FD_Vars.
+    summands is a list of (sign, word) pairs. (For operator '*', the two factors, both with sign 1.)
+    sum is the sum (or product).
+    Unless leading_zeros, the first letter of a word of more than one letter may not be 0.
+    None if there are more letters than digits.
     """
-    var_letters = sorted(list(set(term_1 + term_2 + sum)))
-    if len(var_letters) > 10:
-        print(f'Too many variables: {var_letters}')
-        return
-    # noinspection PyUnboundLocalVariable
-    init_domain = set(range(10))
+    words = [word for (_, word) in summands] + [sum]
+    var_letters = sorted(list(set("".join(words))))
+    if len(var_letters) > base: return None
+    # Start with a clean All_Different so that successive problems don't accumulate siblings.
+    Solver_FD.set_up()
+    init_domain = set(range(base))
     vars_dict = {letter: Digit_FD(frozenset(init_domain), var_name=letter) for letter in var_letters}
-    zero = Digit_FD(frozenset({0}), var_name='_')
-    zero.was_propagated = True
-    sum_length = len(sum)
-    term_1_vars = [zero]*(sum_length - len(term_1)) + Digit_FD.letters_to_vars(term_1, vars_dict)
-    term_2_vars = [zero]*(sum_length - len(term_2)) + Digit_FD.letters_to_vars(term_2, vars_dict)
-    sum_vars =                                        Digit_FD.letters_to_vars(sum, vars_dict)
-
     problem_vars = set(vars_dict.values())
     All_Different(problem_vars)
+    if not leading_zeros:
+        for word in words:
+            if len(word) > 1:
+                vars_dict[word[0]].set_init_domain(vars_dict[word[0]].domain - {0})
 
-    # # Leading_Digit_FDs are the variables that should not be assigned 0.
-    # Leading_Digit_FDs = letters_to_vars({term_1[0], term_2[0], sum[0]}, vars_dict)
-    carries = [Digit_FD(frozenset({0, 1}), var_name=f'C{i}') for i in range(sum_length)]
-    for c in carries:
-        c.was_propagated = True
-    columns = list(zip(carries, term_1_vars, term_2_vars, sum_vars))
+    signs = [sign for (sign, _) in summands]
+    if operator == '*':
+        factors = [Digit_FD.letters_to_vars(word, vars_dict) for (_, word) in summands]
+        return Crypto_FD([], factors, signs, Digit_FD.letters_to_vars(sum, vars_dict), [], problem_vars,
+                         trace=trace, base=base, operator=operator)
 
+    zero = Digit_FD(frozenset({0}), var_name='_')
+    zero.was_propagated = True
+    # A subtracted summand may be longer than the sum.
+    width = max(len(word) for word in words)
+    (summands_vars, sum_vars) = ([[zero]*(width - len(word)) + Digit_FD.letters_to_vars(word, vars_dict)
+                                  for word in words[:-1]],
+                                 [zero]*(width - len(sum)) + Digit_FD.letters_to_vars(sum, vars_dict))
+
+    # The carry out of a column is at most floor((positives*(base-1) + max carry in) / base) and at
+    # least ceiling((-negatives*(base-1) - (base-1) + min carry in) / base). Iterate to get the range.
+    (positives, negatives) = (signs.count(1), signs.count(-1))
+    (min_carry, max_carry) = (0, 0)
+    for _ in range(len(summands) + 1):
+        (min_carry, max_carry) = (-((negatives * (base-1) + (base-1) - min_carry) // base),
+                                  (positives * (base-1) + max_carry) // base)
     # Mark carries as was_propagated since they are never propagated.
+    carries = [Digit_FD(frozenset(range(min_carry, max_carry + 1)), var_name=f'C{i}') for i in range(width)]
+    for c in carries:
+        c.was_propagated = True
     carries[-1].set_init_domain(frozenset({0}), was_propagated=True)
+    columns = [[carries[i]] + [summand_vars[i] for summand_vars in summands_vars] + [sum_vars[i]]
+               for i in range(width)]
+
+    crypto_solver = Crypto_FD(carries, summands_vars, signs, sum_vars, columns, problem_vars, trace=trace,
+                              word_equation=word_equation, base=base)
+    return crypto_solver
+
+
+def parse_puzzle(puzzle: str) -> Optional[Tuple[List[Tuple[int, str]], str, str]]:
+    """
+    'SEND + MORE = MONEY' -> ([(1, 'SEND'), (1, 'MORE')], 'MONEY', '+')
+    'FORTY + TEN + TEN - SIXTY = ZERO' and 'TWO * TWO = SQUARE' are also allowed.
+    None if puzzle is not of one of those forms.
+    """
+    (lhs, equals, sum) = puzzle.upper().replace(' ', '').partition('=')
+    operator = '*' if '*' in lhs else '+'
+    if operator == '*':
+        words = lhs.split('*')
+        summands = [(1, word) for word in words] if len(words) == 2 else []
+    else:
+        # Split 'A+B-C' into [(1, 'A'), (1, 'B'), (-1, 'C')].
+        summands = [(-1 if sign == '-' else 1, word) for (sign, word) in re.findall(r'([+-]?)([^+-]*)', lhs) if word]
+    if not equals or not summands or not all(word.isalpha() for (_, word) in summands) or not sum.isalpha():
+        return None
+    return (summands, sum, operator)
+
+
+def set_up(term_1: str, term_2: str, sum: str, trace=False, word_equation=False):
+    """
+    Convert the initial string representation to (uninstantiated) FD_Vars.
+    term_1 and term_2 are the numbers to be added. sum is the sum.
+    zero is 0. It will be replaced by leading blanks.
+    If word_equation, propagate the whole-word equation along with the column equations.
+    """
+    crypto_solver = build_crypto_solver([(1, term_1), (1, term_2)], sum, trace=trace, word_equation=word_equation)
+    if crypto_solver is None: return
+
+    (carries, sum_vars) = (crypto_solver.carries, crypto_solver.sum_vars)
+    problem_vars = {v for v in crypto_solver.vars if v in All_Different.sibs_dict}
     if len(term_1) == len(term_2) == len(sum)-1:
         carries[0].set_init_domain(frozenset({1}), was_propagated=True)
         sum_vars[0].set_init_domain(frozenset({1}), was_propagated=True)
         for v in problem_vars-{sum_vars[0]}:
             v.set_init_domain(v.domain-{1}, was_propagated=False)
-
-    crypto_solver = Crypto_FD(carries, term_1_vars, term_2_vars, sum_vars, columns, problem_vars, trace=trace)
     return crypto_solver
 
 
+def set_up_puzzle(puzzle: str, base=10, leading_zeros=False, trace=False, word_equation=False):
+    """
+    Set up a puzzle written as a string, e.g., 'SEND + MORE = MONEY', 'FORTY + TEN + TEN = SIXTY',
+    'SEND - MORE = ...', or 'TWO * TWO = SQUARE', in base base.
+    Unlike set_up, by default leading letters may not be 0.
+    None if it isn't a puzzle or has more letters than digits.
+    """
+    parsed = parse_puzzle(puzzle)
+    if parsed is None:
+        print(f'Not a puzzle: {puzzle}')
+        return
+    (summands, sum, operator) = parsed
+    return build_crypto_solver(summands, sum, operator=operator, base=base, leading_zeros=leading_zeros,
+                               trace=trace, word_equation=word_equation)
+
+
 if __name__ == '__main__':
     run_problem()
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import json
+import re
+from argparse import ArgumentParser
+from multiprocessing import Pool
+from os import cpu_count, path
+from tempfile import gettempdir
+from time import perf_counter
+from typing import Dict, Iterator, Optional, Tuple
+
+import cryptarithmetic_FD
+from solver import All_Different
+
+"""
+Solve a corpus of alphametics in parallel.
+
+Puzzles are read from a file, one per line, e.g., SEND + MORE = MONEY, FORTY + TEN + TEN = SIXTY,
+or TWO * TWO = SQUARE. A line may end with, e.g., "base 16" to solve it in base 16. They are streamed
+to a pool of worker processes, each of which solves its puzzle with Crypto_FD under a
+per-puzzle time limit. One JSON result per puzzle is written (and flushed) as soon as it
+is available, so a long run can be watched--or resumed from--as it goes. Throughput
+statistics are printed at the end.
+
+By default, as in cryptarithmetic_FD.set_up_puzzle, the first letter of a word of more than one
+letter may not be 0. (The runner used to call set_up, which allows leading zeros except where it
+pins a carried-out first digit to 1. That can give more solutions.) --leading-zeros allows them.
+"""
+
+
+def read_puzzles(file_name: str) -> Iterator[Tuple[int, str]]:
+    """ Generate (line number, puzzle) for the non-blank, non-comment lines of file_name. """
+    with open(file_name) as puzzles:
+        for (line_no, line) in enumerate(puzzles, start=1):
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield (line_no, line)
+
+
+def solve_puzzle(job: Tuple[int, str, Optional[float], bool]) -> Dict:
+    """
+    Solve one puzzle. Look for a second solution only to decide uniqueness.
+    Runs in a worker process. So it takes and returns only picklable values, and it returns an
+    'error' result (with the exception) rather than raise.
+    """
+    (line_no, puzzle, time_limit, leading_zeros) = job
+    result = {'line': line_no, 'puzzle': puzzle, 'solution': None, 'unique': None, 'nodes': 0}
+    start = perf_counter()
+    try:
+        # An optional trailing "base N".
+        base_match = re.search(r'\s+base\s+(\d+)\s*$', puzzle, re.I)
+        (equation, base) = (puzzle[:base_match.start()], int(base_match.group(1))) if base_match else (puzzle, 10)
+        crypto_solver = cryptarithmetic_FD.set_up_puzzle(equation, base=base, leading_zeros=leading_zeros)
+        if crypto_solver is None:
+            result['status'] = 'error'
+        else:
+            crypto_solver.time_limit = time_limit
+            solutions = 0
+            for _ in crypto_solver.solve():
+                solutions += 1
+                if solutions == 1:
+                    letters = sorted((v for v in crypto_solver.vars if v in All_Different.sibs_dict),
+                                     key=lambda v: v.var_name)
+                    result['solution'] = {v.var_name: v.value for v in letters}
+                else:
+                    break
+            result['nodes'] = crypto_solver.line_no
+            result['status'] = 'timeout' if crypto_solver.timed_out else 'solved' if solutions else 'no solution'
+            # A timeout after finding one solution leaves uniqueness unknown.
+            result['unique'] = None if crypto_solver.timed_out else solutions == 1
+    except Exception as error:
+        # A puzzle that raises is reported. It doesn't stop the run.
+        (result['status'], result['error']) = ('error', f'{type(error).__name__}: {error}')
+    result['seconds'] = round(perf_counter() - start, 4)
+    return result
+
+
+def run_batch(puzzles_file, results_file, workers=None, time_limit=10.0, leading_zeros=False):
+    """ Solve the puzzles in puzzles_file with a pool of workers, writing JSONL to results_file. """
+    counts = {'solved': 0, 'no solution': 0, 'timeout': 0, 'error': 0}
+    (unique, total_nodes, max_seconds) = (0, 0, 0.0)
+    start = perf_counter()
+    jobs = ((line_no, puzzle, time_limit, leading_zeros) for (line_no, puzzle) in read_puzzles(puzzles_file))
+    with Pool(workers) as pool, open(results_file, 'w') as results:
+        for result in pool.imap_unordered(solve_puzzle, jobs, chunksize=4):
+            results.write(json.dumps(result) + '\n')
+            results.flush()
+            counts[result['status']] += 1
+            unique += bool(result['unique'])
+            total_nodes += result['nodes']
+            max_seconds = max(max_seconds, result['seconds'])
+    elapsed = perf_counter() - start
+    puzzles = sum(counts.values())
+
+    print(f'\n{puzzles} puzzles in {elapsed:.2f} seconds with {workers or cpu_count()} workers: '
+          f'{puzzles / elapsed if elapsed else 0:.1f} puzzles/second.')
+    print(", ".join(f'{status}: {count}' for (status, count) in counts.items()) + f'; unique: {unique}')
+    print(f'nodes: {total_nodes} ({total_nodes / elapsed if elapsed else 0:.0f}/second); '
+          f'slowest puzzle: {max_seconds:.3f} seconds')
+    print(f'Results in {results_file}')
+
+
+if __name__ == '__main__':
+    arg_parser = ArgumentParser(description='Solve a file of alphametics, one per line, in parallel.')
+    arg_parser.add_argument('puzzles', nargs='?',
+                            default=path.join(path.dirname(path.abspath(__file__)), 'crypto_puzzles.txt'))
+    arg_parser.add_argument('--results', default=path.join(gettempdir(), 'crypto_results.jsonl'),
+                            help='the JSONL results file (default: in the temp directory)')
+    arg_parser.add_argument('--workers', type=int, default=None)
+    arg_parser.add_argument('--time-limit', type=float, default=10.0, help='seconds per puzzle')
+    arg_parser.add_argument('--leading-zeros', action='store_true', help='let a word start with 0')
+    args = arg_parser.parse_args()
+    run_batch(args.puzzles, args.results, workers=args.workers, time_limit=args.time_limit,
+              leading_zeros=args.leading_zeros)
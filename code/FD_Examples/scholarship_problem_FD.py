@@ -1,6 +1,9 @@
 from __future__ import annotations
 
-from solver import All_Different, Solver_FD, Var_FD
+from random import Random
+from time import perf_counter
+
+from solver import All_Different, Binary_FD, Const_FD, Solver_FD, Var_FD
 
 """
 A puzzle from GeekOverdose: https://geekoverdose.wordpress.com/2015/10/31/solving-logic-puzzles-in-prolog-puzzle-1-of-3/
@@ -80,39 +83,133 @@ class Const_Stdnt(Stdnt):
 
 
 class Clues_Solver(Solver_FD):
+    """
+    Runs the clues one at a time. Each alternative of a clue is a branch.
+
+    If dynamic is True, the clues are not run in the order given. Before each step, every pending
+    clue is probed: its alternatives under the current domains are counted. The clue with the fewest
+    runs next (fail first). If some clue has none, the branch fails at once. A clue one of whose
+    alternatives narrows nothing is already satisfied by every completion of the current domains.
+    It is dropped without being run.
+
+    If shave is True, the domains are shaved before the search starts. Each clue is run through all
+    its alternatives, and each var is narrowed to the union of its domains in those alternatives
+    (constructive disjunction). That repeats until no clue narrows anything. It infers derived
+    clues like clue_d.
+    """
 
     def __init__(self, vars, students, clues, clue_index=0,
-                 constraints=frozenset({All_Different.all_satisfied}), trace=False):
+                 constraints=frozenset({All_Different.all_satisfied}), dynamic=True, shave=True, trace=False):
         super().__init__(vars, constraints=constraints, trace=trace)
+        self.choice = None
         self.clue = None
         self.clues = clues
         self.clue_index = clue_index
+        self.dynamic = dynamic
+        # The clues not yet run or dropped, and a stack of the clues being run.
+        self.pending = list(clues[clue_index:])
+        self.ran = []
+        # The number of times a clue has been probed.
+        self.probes = 0
+        self.shave = shave
         self.students = students
 
+    def clue_unions(self, clue):
+        """
+        {var: the union of var's domains over the alternatives of clue}, or None if clue has no alternatives.
+        """
+        unions = None
+        for _ in clue(self.students):
+            if All_Different.all_satisfied():
+                unions = {v: v.domain for v in self.vars} if unions is None else \
+                         {v: unions[v] | v.domain for v in self.vars}
+        return unions
+
     def narrow(self):
         yield from self.run_a_clue()
 
+    def probe(self, clue):
+        """ (the number of alternatives clue has under the current domains, whether one of them narrows nothing) """
+        self.probes += 1
+        domains = [v.domain for v in self.vars]
+        (alternatives, narrows_nothing) = (0, False)
+        for _ in clue(self.students):
+            if All_Different.all_satisfied():
+                alternatives += 1
+                narrows_nothing = narrows_nothing or all(v.domain == d for (v, d) in zip(self.vars, domains))
+        return (alternatives, narrows_nothing)
+
     def problem_is_solved(self):
+        """ When scheduling dynamically, also solved if all the pending clues are already satisfied. """
         problem_solved = self.clue_index >= len(self.clues)
+        if self.dynamic and not problem_solved:
+            # search( ) calls narrow( ) right after this, in the same state. Keep the choice for it.
+            self.choice = self.select_clue()
+            problem_solved = self.choice is not None and self.choice[0] is None
         return problem_solved
 
+    def propagate_consequences(self):
+        """ Called before the search starts. (Clues_Solver's narrow( ) doesn't call it.) """
+        if not self.shave:
+            yield from super().propagate_consequences()
+            return
+        for _ in self.shave_domains():
+            yield from super().propagate_consequences()
+
     def run_a_clue(self):
-        self.clue = self.clues[self.clue_index]
-        # We know the current clue. Increment clue_index in anticipation of next call.
-        self.clue_index += 1
+        choice = self.choice if self.dynamic else (self.pending[0], [])
+        # Some clue has no alternatives. Fail.
+        if choice is None: return
+        (self.clue, satisfied) = choice
+        pending = self.pending
+        self.pending = [clue for clue in pending if clue is not self.clue and clue not in satisfied]
+        # clue_index counts the clues run or dropped.
+        self.clue_index = len(self.clues) - len(self.pending)
+        self.ran.append(self.clue)
         for _ in self.clue(self.students):
             if All_Different.all_satisfied():
                 yield
-        # Decrement clue_index back to where it was.
-        self.clue_index -= 1
+        self.ran.pop()
+        # Put the pending clues back the way they were.
+        self.pending = pending
+        self.clue_index = len(self.clues) - len(self.pending)
+
+    def select_clue(self):
+        """
+        None if some pending clue has no alternatives. Otherwise (the unsatisfied clue with the
+        fewest alternatives--None if there is none, the clues that are already satisfied).
+        """
+        (best, fewest, satisfied) = (None, None, [])
+        for clue in self.pending:
+            (alternatives, narrows_nothing) = self.probe(clue)
+            if alternatives == 0: return None
+            if narrows_nothing:
+                satisfied.append(clue)
+            elif fewest is None or alternatives < fewest:
+                (best, fewest) = (clue, alternatives)
+        return (best, satisfied)
+
+    def shave_domains(self, index=0, unchanged=0):
+        """
+        Narrow each var to the union of its domains over the alternatives of clue index. Then go on to
+        the next clue, round and round, until unchanged (the number of clues in a row that narrowed
+        nothing) covers all the pending clues. Fail if a clue has no alternatives.
+        """
+        if unchanged >= len(self.pending):
+            yield
+            return
+        unions = self.clue_unions(self.pending[index % len(self.pending)])
+        if unions is None: return
+        narrowed = [(v, Const_FD(unions[v])) for v in self.vars if len(unions[v]) < len(v.domain)]
+        for _ in Solver_FD.unify_pairs_FD(narrowed):
+            yield from self.shave_domains(index + 1, 0 if narrowed else unchanged + 1)
 
     def state_string(self, solved=False):
-        self.clue = self.clues[self.clue_index-1]
-        clue_name = 'at start' if self.clue_index == 0 else self.clue.__name__
+        clue_name = 'at start' if not self.ran else self.ran[-1].__name__
         spacer = "* " if solved else ". "
         state_str = f'{" " if self.line_no < 10 else ""}{self.line_no}.' \
                     f'{" " * (10 - len(clue_name))}({clue_name}) '       \
-                    f'{spacer * (self.clue_index + 1)}'                  \
+                    f'{spacer * (len(self.ran) + 1)}'                     \
                     f'{Stdnt.stdnts_to_string(self.students)}'
         return state_str
 
@@ -158,8 +255,9 @@ def clue_d(Stdnts):
          Const_Stdnt(name=Stdnt.names-{'Lynn'}, major=Stdnt.majors-{'Bio', 'CS', 'Phys'})], Stdnts)
 
 
-if __name__ == '__main__':
-
+def run(clues, dynamic, shave=True, trace=False):
+    """ Solve with clues. Return (the number of states shown, the number of clue probes). """
+    Stdnt.id = 0
     students = [Stdnt(name=Stdnt.names, major=Stdnt.majors) for _ in range(4)]
     name_vars = {std.name for std in students}
     major_vars = {std.major for std in students}
@@ -168,12 +266,71 @@ if __name__ == '__main__':
     All_Different(name_vars)
     All_Different(major_vars)
 
-    # Do the derived clue first since it sets 3 things and has no alternatives.
-    # Do clue_3_4 next since it sets 3 things and after the derived clue has no alternatives.
-    # Then clue_2 since it now has no alternatives.
-    # Clue_5 finishes the job, again with no alternatives.
-    # Can drop clue_1 since it is satisfied after clue 2.
-    clues = [clue_d, clues_3_4, clue_2, clue_5]  #, clue_1]
+    clues_solver = Clues_Solver(name_vars | major_vars, students, clues, dynamic=dynamic, shave=shave,
+                                trace=trace)
+    for _ in clues_solver.solve():
+        for (i, std) in enumerate(students):
+            std.scholarship = 25 + 5*i
+        if trace: print(f'\nSolution: {Stdnt.stdnts_to_string(students)}\n')
+        for (i, std) in enumerate(students):
+            std.scholarship = None
+    if trace: print('\nNo other solutions')
+    return (clues_solver.line_no, clues_solver.probes)
+
+
+def position_vars(values, n):
+    """ {value: a Var_FD for its position}. Each value is at a different position in range(n). """
+    positions = {value: Var_FD(range(n), var_name=value) for value in sorted(values)}
+    All_Different(set(positions.values()))
+    return positions
+
+
+def solve_by_positions():
+    """
+    The clues compiled into propagating constraints. Each name and each major gets a position
+    var: its place in the order of increasing scholarships. Each clue is a relation between two
+    positions, which Binary_FD narrows before any branching.
+    """
+    Solver_FD.set_up()
+    (names, majors) = (position_vars(Stdnt.names, 4), position_vars(Stdnt.majors, 4))
+    clues = [Binary_FD.before(majors['Phys'], names['Emmy']),                # clue 1
+             # Emmy studies Bio or Math: not CS and not Phys.
+             Binary_FD.different(names['Emmy'], majors['CS']),               # clue 2
+             Binary_FD.different(names['Emmy'], majors['Phys']),
+             Binary_FD.immediately_before(names['Lynn'], majors['CS']),      # clue 3
+             Binary_FD.offset(names['Lynn'], names['Marie'], 2),             # clue 4
+             Binary_FD.before(majors['Bio'], names['Ada'])]                  # clue 5
+    solver = Solver_FD(set(names.values()) | set(majors.values()), propagators=clues)
+    solutions = []
+    for _ in solver.solve():
+        by_position = {}
+        for (value, var) in list(names.items()) + list(majors.items()):
+            by_position.setdefault(var.value, []).append(value)
+        solutions.append('; '.join(f'${25 + 5*p},000: {"/".join(by_position[p])}' for p in sorted(by_position)))
+    return solutions
+
+
+def random_positional_puzzle(n, seed):
+    """
+    A puzzle about the order of n people, all of whose clues are true of a hidden order: for each
+    two people next to each other, "a is next to b" or "a is immediately before b", plus n random
+    "a is before b" clues. Return (the number of solutions, the number of clues, seconds).
+    """
+    rng = Random(seed)
+    order = rng.sample([f'P{i}' for i in range(n)], n)
+    Solver_FD.set_up()
+    positions = position_vars(order, n)
+    clues = [rng.choice([Binary_FD.next_to, Binary_FD.immediately_before])(positions[a], positions[b])
+             for (a, b) in zip(order, order[1:])]
+    for _ in range(n):
+        (i, j) = sorted(rng.sample(range(n), 2))
+        clues.append(Binary_FD.before(positions[order[i]], positions[order[j]]))
+    start = perf_counter()
+    solutions = sum(1 for _ in Solver_FD(set(positions.values()), propagators=clues).solve())
+    return (solutions, len(clues), perf_counter() - start)
+
+
+if __name__ == '__main__':
 
     print('\nStudents:', ', '.join(sorted(Stdnt.names)))
     print('Majors:', ', '.join(sorted(Stdnt.majors)))
@@ -197,16 +354,34 @@ if __name__ == '__main__':
     3. Then clue_2 since it now has no alternatives.
     4. Clue_5 finishes the job, again with no alternatives.
     Can drop clue_1 since it is satisfied after clue 2.
+    
+    The Clues_Solver finds that ordering itself. Before each step it counts the
+    alternatives each remaining clue has, runs the clue with the fewest, and drops
+    clues (like clue_1) that are already satisfied.
+    
+    It also derives clue_d itself. Before the search, it runs each clue through
+    all its alternatives and narrows each var to the union of its domains in them,
+    until nothing changes. For this puzzle, that alone finds the solution. (Line 1
+    below is the state after it.)
 """)
 
     print('*: Var was directly instantiated--and propagated if propagation is on.\n'
           '-: Var was indirectly instantiated but not propagated.\n')
 
-    clues_solver = Clues_Solver(name_vars | major_vars, students, clues, trace=True)
-    for _ in clues_solver.solve():
-        for (i, std) in enumerate(students):
-            std.scholarship = 25 + 5*i
-        print(f'\nSolution: {Stdnt.stdnts_to_string(students)}\n')
-        for (i, std) in enumerate(students):
-            std.scholarship = None
-    print('\nNo other solutions')
+    clues = [clue_1, clue_2, clues_3_4, clue_5]
+    run(clues, dynamic=True, trace=True)
+
+    print('\nStates shown (and clue probes) for the clues in the order given; scheduled dynamically; '
+          'and also shaved:')
+    for clues in [[clue_d, clues_3_4, clue_2, clue_5], [clue_1, clue_2, clues_3_4, clue_5, clue_d],
+                  [clue_1, clue_2, clues_3_4, clue_5]]:
+        names = ", ".join(clue.__name__ for clue in clues)
+        print(f'    [{names}]: {run(clues, dynamic=False, shave=False)[0]}; '
+              f'{run(clues, dynamic=True, shave=False)}; {run(clues, dynamic=True)}')
+
+    print('\nThe clues compiled into positional constraints:')
+    for solution in solve_by_positions():
+        print(f'    {solution}')
+    for n in [10, 15, 20]:
+        (solutions, clues, seconds) = random_positional_puzzle(n, seed=n)
+        print(f'A random puzzle with {n} positions and {clues} clues: {solutions} solution(s); {seconds:.3f} seconds.')
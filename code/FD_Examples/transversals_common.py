@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+from collections import deque
+from itertools import combinations
+from random import Random
+from time import perf_counter
+from typing import Dict, FrozenSet, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+
+from transversals_matching import Transversal_Matching
+
+"""
+Common transversals of several families of sets.
+
+Following Weinberger (see the paper's transversals.py), a set K of elements is a common
+transversal of families F_1, ..., F_k, each of n sets, if K is a transversal of each of them:
+|K| == n, and the elements of K can be assigned one-to-one to the sets of each family.
+
+The partial transversals of a family are the independent sets of a matroid: its transversal
+matroid. So for two families, a common transversal is a common independent set of size n of
+two matroids, which the matroid intersection algorithm finds (or shows not to exist) in
+polynomial time. At its end, it also yields a proof that none exists: a split of the elements
+into A and B with rank_1(A) + rank_2(B) < n. (Every common independent set has at most
+rank_1(A) elements in A and rank_2(B) in B.)
+
+For three or more families, the problem is NP-hard. They are searched, element by element,
+pruning any branch in which some family can no longer be completed.
+"""
+
+
+# A matching of elements into a family's sets: ({element: set index}, {set index: element}).
+Matching = Tuple[Dict[Hashable, int], Dict[int, Hashable]]
+
+
+class Transversal_Matroid:
+    """ The transversal matroid of a family: a set of elements is independent if it can be matched into the family. """
+
+    def __init__(self, family):
+        self.sets: List[FrozenSet] = [Transversal_Matching.set_elements(s) for s in family]
+        # holders[x] is the list of (indices of) the sets that contain x.
+        self.holders: Dict[Hashable, List[int]] = {}
+        for (i, s) in enumerate(self.sets):
+            for x in s:
+                self.holders.setdefault(x, []).append(i)
+
+    def augment(self, y: Hashable, matching: Matching) -> bool:
+        """
+        Try to add element y to matching by an alternating path from y to a free set.
+        Return whether it worked.
+        """
+        (by_element, by_set) = matching
+        (parent, queue) = ({y: None}, deque([y]))
+        while queue:
+            x = queue.popleft()
+            for i in self.holders.get(x, ()):
+                owner = by_set.get(i)
+                if owner is None:
+                    # Flip the path: x takes i, x's old set goes to x's parent, ....
+                    while x is not None:
+                        old_i = by_element.get(x)
+                        (by_element[x], by_set[i]) = (i, x)
+                        (x, i) = (parent[x], old_i)
+                    return True
+                if owner not in parent:
+                    parent[owner] = x
+                    queue.append(owner)
+        return False
+
+    def matching(self, elements: Iterable[Hashable]) -> Matching:
+        """ A maximum matching of elements into the family. """
+        matching = ({}, {})
+        for y in elements:
+            self.augment(y, matching)
+        return matching
+
+    def rank(self, elements: Iterable[Hashable]) -> int:
+        (by_element, _) = self.matching(elements)
+        return len(by_element)
+
+    def reachable_sets(self, y: Hashable, matching: Matching) -> Tuple[bool, Set[int]]:
+        """
+        (whether a free set is reachable, the sets reachable) along alternating paths from element y.
+        If set i is reachable and matched to x, then I - x + y is independent.
+        """
+        (seen_elements, seen_sets, queue) = ({y}, set(), deque([y]))
+        while queue:
+            x = queue.popleft()
+            for i in self.holders.get(x, ()):
+                if i in seen_sets: continue
+                seen_sets.add(i)
+                owner = matching[1].get(i)
+                if owner is None: return (True, seen_sets)
+                if owner not in seen_elements:
+                    seen_elements.add(owner)
+                    queue.append(owner)
+        return (False, seen_sets)
+
+
+class Common_Transversal:
+
+    def __init__(self, families):
+        self.families: List[List[FrozenSet]] = [[Transversal_Matching.set_elements(s) for s in family]
+                                                for family in families]
+        self.matroids = [Transversal_Matroid(family) for family in self.families]
+        self.n = len(self.families[0]) if self.families else 0
+        # All the elements, in a fixed order.
+        self.elements: List[Hashable] = sorted({x for family in self.families for s in family for x in s}, key=repr)
+        self.nodes = 0
+
+    def all(self) -> Iterator[FrozenSet]:
+        """ Generate every common transversal (as a set of elements) once. """
+        if self.sizes_differ(): return
+        matchings = [({}, {}) for _ in self.matroids]
+        yield from self.extend([], 0, matchings)
+
+    def assignment(self, k: int, transversal: Iterable[Hashable]) -> List[Hashable]:
+        """ The element of transversal that represents each set of family k. """
+        (_, by_set) = self.matroids[k].matching(transversal)
+        return [by_set[i] for i in range(self.n)]
+
+    def certificate(self) -> Optional[Tuple]:
+        """
+        None if there is a common transversal. Otherwise, if possible, a quick proof that there is none:
+            ('sizes', [the family sizes])                  The families have different numbers of sets.
+            ('hall', k, [indices of sets in family k])     Family k has no transversal at all.
+            ('rank', k_1, k_2, A)                          rank_k_1(A) + rank_k_2(the other elements) < n.
+        None also if there is no common transversal but no such proof. (Possible with 3 or more families.)
+        """
+        if self.sizes_differ(): return ('sizes', [len(family) for family in self.families])
+        for (k, family) in enumerate(self.families):
+            violator = Transversal_Matching(family).hall_violator()
+            if violator is not None: return ('hall', k, violator)
+        for (k_1, k_2) in combinations(range(len(self.families)), 2):
+            (common, a) = self.intersect(k_1, k_2)
+            if len(common) < self.n: return ('rank', k_1, k_2, a)
+        return None
+
+    def count(self) -> int:
+        return sum(1 for _ in self.all())
+
+    def exchange_graph(self, k_1: int, k_2: int, independent: Set[Hashable]) \
+            -> Tuple[Set[Hashable], Set[Hashable], Dict[Hashable, List[Hashable]]]:
+        """
+        The exchange graph of the two matroids for the common independent set independent:
+        (sources, sinks, edges). y (not in independent) is a source if independent + y is independent in
+        matroid k_1, and a sink if it is in matroid k_2. There is an edge x -> y if independent - x + y
+        is independent in matroid k_1, and y -> x if it is in matroid k_2.
+        """
+        (m_1, m_2) = (self.matroids[k_1], self.matroids[k_2])
+        (matching_1, matching_2) = (m_1.matching(independent), m_2.matching(independent))
+        (sources, sinks, edges) = (set(), set(), {x: [] for x in self.elements})
+        for y in self.elements:
+            if y in independent: continue
+            (free, reached) = m_1.reachable_sets(y, matching_1)
+            if free:
+                sources.add(y)
+            else:
+                for i in reached:
+                    edges[matching_1[1][i]].append(y)
+            (free, reached) = m_2.reachable_sets(y, matching_2)
+            if free:
+                sinks.add(y)
+            else:
+                edges[y] += [matching_2[1][i] for i in reached]
+        return (sources, sinks, edges)
+
+    def extend(self, chosen: List[Hashable], start: int, matchings: List[Matching]) -> Iterator[FrozenSet]:
+        """ Extend chosen with elements from self.elements[start:], keeping it independent in every matroid. """
+        self.nodes += 1
+        if len(chosen) == self.n:
+            yield frozenset(chosen)
+            return
+        if len(chosen) + len(self.elements) - start < self.n: return
+        # Prune unless every family can still be completed from the chosen and the remaining elements.
+        remaining = self.elements[start:]
+        for (matroid, matching) in zip(self.matroids, matchings):
+            completed = (dict(matching[0]), dict(matching[1]))
+            if sum(matroid.augment(y, completed) for y in remaining) < self.n - len(chosen): return
+        for index in range(start, len(self.elements)):
+            y = self.elements[index]
+            new_matchings = [(dict(by_element), dict(by_set)) for (by_element, by_set) in matchings]
+            if all(matroid.augment(y, matching) for (matroid, matching) in zip(self.matroids, new_matchings)):
+                yield from self.extend(chosen + [y], index + 1, new_matchings)
+
+    def find(self) -> Optional[FrozenSet]:
+        """ A common transversal, or None. Matroid intersection for two families; search for more. """
+        if self.sizes_differ() or not self.families: return None
+        if len(self.families) == 2:
+            (common, _) = self.intersect(0, 1)
+            return frozenset(common) if len(common) == self.n else None
+        return next(self.all(), None)
+
+    def intersect(self, k_1: int, k_2: int) -> Tuple[Set[Hashable], Set[Hashable]]:
+        """
+        A maximum common independent set of matroids k_1 and k_2, and the set A that proves it maximum:
+        its size is rank_k_1(A) + rank_k_2(the other elements).
+
+        Repeatedly find a shortest path from a source to a sink in the exchange graph and flip the
+        elements on it in or out. When no sink can be reached, A is the set of elements not reached.
+        """
+        independent = set()
+        while True:
+            (sources, sinks, edges) = self.exchange_graph(k_1, k_2, independent)
+            (parent, queue, end) = ({y: None for y in sources}, deque(sources), None)
+            while queue:
+                x = queue.popleft()
+                if x in sinks:
+                    end = x
+                    break
+                for y in edges[x]:
+                    if y not in parent:
+                        parent[y] = x
+                        queue.append(y)
+            if end is None:
+                return (independent, set(self.elements) - set(parent))
+            while end is not None:
+                independent ^= {end}
+                end = parent[end]
+
+    def sizes_differ(self) -> bool:
+        return len({len(family) for family in self.families}) > 1
+
+
+if __name__ == '__main__':
+    print('Two families: A = ({1, 2}, {2, 3}, {3, 4}) and B = ({1, 3}, {2, 4}, {4, 5}).')
+    common = Common_Transversal([[{1, 2}, {2, 3}, {3, 4}], [{1, 3}, {2, 4}, {4, 5}]])
+    transversal = common.find()
+    print(f'A common transversal: {sorted(transversal)}; represents A\'s sets by {common.assignment(0, transversal)} '
+          f'and B\'s by {common.assignment(1, transversal)}. All: {sorted(sorted(t) for t in common.all())}')
+
+    common = Common_Transversal([[{1, 2}, {1, 2}, {3, 4}], [{1, 3}, {2, 3}, {1, 2}]])
+    print(f'\nA = ({{1, 2}}, {{1, 2}}, {{3, 4}}); B = ({{1, 3}}, {{2, 3}}, {{1, 2}}): find: {common.find()}; '
+          f'certificate: {common.certificate()}')
+
+    # Random families: matroid intersection vs. search.
+    rng = Random(0)
+    for _ in range(200):
+        (n, universe) = (rng.randint(2, 6), rng.randint(4, 9))
+        families = [[set(rng.sample(range(universe), rng.randint(1, 3))) for _ in range(n)] for _ in range(2)]
+        common = Common_Transversal(families)
+        assert (common.find() is None) == (next(common.all(), None) is None) == (common.certificate() is not None)
+        certificate = common.certificate()
+        if certificate and certificate[0] == 'rank':
+            (_, k_1, k_2, a) = certificate
+            others = set(common.elements) - a
+            assert common.matroids[k_1].rank(a) + common.matroids[k_2].rank(others) < n
+    print('\nMatroid intersection agrees with search on 200 random pairs of families.')
+
+    # Larger pairs: only matroid intersection.
+    for n in [30, 60]:
+        families = [[{i} | set(rng.sample(range(2 * n), 3)) for i in range(n)],
+                    [{(i * 7) % n} | set(rng.sample(range(2 * n), 3)) for i in range(n)]]
+        start = perf_counter()
+        common = Common_Transversal(families)
+        transversal = common.find()
+        print(f'{n} sets per family: common transversal: {transversal is not None}; '
+              f'{perf_counter() - start:.2f} seconds')
+
+    # Three families: search.
+    families = [[set(rng.sample(range(8), 3)) for _ in range(5)] for _ in range(3)]
+    common = Common_Transversal(families)
+    print('\nThree families:\n' + '\n'.join(f'    {[sorted(s) for s in family]}' for family in families))
+    print(f'common transversals: {common.count()} (search nodes: {common.nodes}); one: {common.find()}; '
+          f'certificate: {common.certificate()}')
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+from collections import deque
+from itertools import count
+from random import Random
+from time import perf_counter
+from typing import Dict, Hashable, Iterable, Optional, Set
+
+from transversals_matching import Transversal_Matching
+
+"""
+Keep a transversal--or as close to one as possible--while the family changes one set at a time.
+
+The family's maximum matching is kept up to date. Adding a set can increase its size by at
+most one, by an augmenting path from the new set. Removing a set frees at most one element,
+and at most one unmatched set can then be matched, by an alternating path back from that
+element. So each change is repaired by a single alternating-path search, which stops as soon
+as it succeeds. Editing a set is removing it and adding it back.
+"""
+
+
+class Dynamic_Transversal:
+
+    def __init__(self, sets: Iterable = ()):
+        self.sets: Dict[Hashable, frozenset] = {}
+        # holders[x] is the set of keys of the sets that contain x.
+        self.holders: Dict[Hashable, Set[Hashable]] = {}
+        # set_match[key] is the element representing set key. element_match is its inverse.
+        self.set_match: Dict[Hashable, Hashable] = {}
+        self.element_match: Dict[Hashable, Hashable] = {}
+        # The keys of the sets with no representative. There is a transversal if and only if this is empty.
+        self.unmatched: Set[Hashable] = set()
+        self.keys = count()
+        # The number of sets visited by the last repair.
+        self.last_repair = 0
+        for s in sets:
+            self.add_set(s)
+
+    def add_set(self, s, key: Hashable = None) -> Hashable:
+        """ Add s (a Var_FD or an iterable of elements) to the family. Return its key. """
+        key = next(self.keys) if key is None else key
+        assert key not in self.sets, f'Key {key} is already in use.'
+        self.sets[key] = elements = Transversal_Matching.set_elements(s)
+        for x in elements:
+            self.holders.setdefault(x, set()).add(key)
+        self.unmatched.add(key)
+        self.augment_from_set(key)
+        return key
+
+    def augment_from_set(self, root: Hashable) -> bool:
+        """
+        Breadth-first search along alternating paths from the unmatched set root to a free element.
+        If one is found, flip the matching along the path.
+        """
+        (parent, queue) = ({root: None}, deque([root]))
+        while queue:
+            key = queue.popleft()
+            for x in self.sets[key]:
+                owner = self.element_match.get(x)
+                if owner is None:
+                    self.unmatched.discard(root)
+                    # Each set on the path takes the element that led to the next one.
+                    while key is not None:
+                        old_x = self.set_match.get(key)
+                        (self.set_match[key], self.element_match[x]) = (x, key)
+                        (key, x) = (parent[key], old_x)
+                    self.last_repair = len(parent)
+                    return True
+                if owner not in parent:
+                    parent[owner] = key
+                    queue.append(owner)
+        self.last_repair = len(parent)
+        return False
+
+    def augment_to_element(self, root: Hashable) -> bool:
+        """
+        root is a free element. Breadth-first search back from it for an unmatched set, along alternating
+        paths: a set containing an element reached may give up its own element to take that one.
+        If an unmatched set is found, shift the matching along the path so that it is matched.
+        """
+        if not self.unmatched: return False
+        (parent, queue, visited) = ({root: None}, deque([root]), 0)
+        while queue:
+            x = queue.popleft()
+            for key in self.holders.get(x, ()):
+                visited += 1
+                if key in self.unmatched:
+                    self.unmatched.discard(key)
+                    # Each set on the path takes the element reached through it, freeing its old one
+                    # for the set before it--until root is taken.
+                    while x is not None:
+                        old_owner = self.element_match.get(x)
+                        (self.set_match[key], self.element_match[x]) = (x, key)
+                        (key, x) = (old_owner, parent[x])
+                    self.last_repair = visited
+                    return True
+                y = self.set_match[key]
+                if y not in parent:
+                    parent[y] = x
+                    queue.append(y)
+        self.last_repair = visited
+        return False
+
+    def edit_set(self, key: Hashable, s) -> Hashable:
+        """ Replace the elements of set key by those of s. """
+        self.remove_set(key)
+        return self.add_set(s, key)
+
+    def hall_violator(self) -> Optional[Set[Hashable]]:
+        """ None if there is a transversal. Otherwise, the keys of sets whose union is smaller than their number. """
+        if not self.unmatched: return None
+        root = next(iter(self.unmatched))
+        (reached, queue) = ({root}, deque([root]))
+        while queue:
+            for x in self.sets[queue.popleft()]:
+                owner = self.element_match[x]
+                if owner not in reached:
+                    reached.add(owner)
+                    queue.append(owner)
+        return reached
+
+    def is_feasible(self) -> bool:
+        return not self.unmatched
+
+    def remove_set(self, key: Hashable):
+        elements = self.sets.pop(key)
+        for x in elements:
+            self.holders[x].discard(key)
+            if not self.holders[x]: del self.holders[x]
+        self.unmatched.discard(key)
+        x = self.set_match.pop(key, None)
+        if x is None:
+            self.last_repair = 0
+        else:
+            del self.element_match[x]
+            # x is free. Perhaps an unmatched set can now be matched through it.
+            self.augment_to_element(x)
+
+    def representative(self, key: Hashable) -> Optional[Hashable]:
+        return self.set_match.get(key)
+
+    def transversal(self) -> Optional[Dict[Hashable, Hashable]]:
+        """ {key: representative} if there is a transversal, else None. """
+        return dict(self.set_match) if not self.unmatched else None
+
+
+if __name__ == '__main__':
+    # A random stream of changes, checked against a from-scratch matching after each one.
+    rng = Random(0)
+    (n, universe) = (300, 320)
+    dynamic = Dynamic_Transversal()
+    keys = []
+    for step in range(3000):
+        operation = rng.choice(['add', 'add', 'remove', 'edit']) if keys else 'add'
+        s = set(rng.sample(range(universe), rng.randint(1, 3)))
+        if operation == 'add' or len(keys) < n // 2:
+            keys.append(dynamic.add_set(s))
+        elif operation == 'remove':
+            dynamic.remove_set(keys.pop(rng.randrange(len(keys))))
+        else:
+            dynamic.edit_set(rng.choice(keys), s)
+        matching = Transversal_Matching(dynamic.sets[key] for key in keys)
+        assert len(dynamic.sets) - len(dynamic.unmatched) == matching.find_matching()
+        assert all(x in dynamic.sets[key] and dynamic.element_match[x] == key for (key, x) in dynamic.set_match.items())
+        if len(keys) > n:
+            dynamic.remove_set(keys.pop(0))
+    print(f'3000 changes agree with from-scratch matching. Sets now: {len(keys)}; '
+          f'feasible: {dynamic.is_feasible()}; unmatched: {len(dynamic.unmatched)}')
+
+    # A large family, changed one set at a time.
+    (n, universe) = (100_000, 110_000)
+    sets = [{i} | set(rng.sample(range(universe), 2)) for i in range(n)]
+    start = perf_counter()
+    dynamic = Dynamic_Transversal(sets)
+    print(f'\nBuilt {n} sets incrementally in {perf_counter() - start:.2f} seconds. Feasible: {dynamic.is_feasible()}')
+    (start, repairs) = (perf_counter(), 0)
+    for _ in range(1000):
+        key = rng.randrange(n)
+        dynamic.edit_set(key, set(rng.sample(range(universe), 3)))
+        repairs += dynamic.last_repair
+    seconds = perf_counter() - start
+    print(f'1000 edits in {seconds:.3f} seconds ({repairs} sets visited). Feasible: {dynamic.is_feasible()}')
+    start = perf_counter()
+    Transversal_Matching(dynamic.sets.values()).find_matching()
+    print(f'One from-scratch matching: {perf_counter() - start:.3f} seconds.')
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import gzip
+from math import gcd
+from os import path
+from random import Random
+from tempfile import gettempdir
+from time import perf_counter
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from transversals_matching import Transversal_Matching
+
+"""
+Seeded, streaming generation of transversal problems for benchmarking and stress tests.
+
+A family is n sets of ints drawn from range(universe). Nothing is held in memory but the
+current set, so families can be far larger than memory when written to disk.
+
+tightness controls whether there is a transversal:
+    'feasible'   Each set contains its own "planted" element, so there is a transversal.
+    'tight'      Also planted, but the universe has exactly n elements, and a planted subfamily
+                 of violator_size sets has only their own planted elements. So Hall's
+                 condition holds--but with no room to spare.
+    'infeasible' violator_size sets draw only from violator_size - 1 elements. So there
+                 is no transversal.
+structure controls where a set's other elements come from:
+    'uniform'    anywhere in the universe.
+    'banded'     within band of the set's planted element.
+    'clustered'  from the block of cluster_size elements that contains the planted element.
+
+File format: a header line starting with #, then one set per line: its elements in increasing
+order, delta-encoded, separated by spaces. E.g., {3, 7, 8} is "3 4 1". A file name ending in .gz
+is compressed.
+"""
+
+
+class Transversal_Generator:
+
+    structures = ('uniform', 'banded', 'clustered')
+    tightnesses = ('feasible', 'tight', 'infeasible')
+
+    def __init__(self, n: int, universe: int = None, seed=None, set_size: Tuple[int, int] = (2, 5),
+                 tightness='feasible', structure='uniform', band=50, cluster_size=100, violator_size=5):
+        assert tightness in Transversal_Generator.tightnesses, f'Unknown tightness: {tightness}'
+        assert structure in Transversal_Generator.structures, f'Unknown structure: {structure}'
+        # A tight family has exactly as many elements as sets.
+        self.universe = n if tightness == 'tight' else universe or n
+        assert self.universe >= n or tightness == 'infeasible', 'A feasible family needs at least n elements.'
+        (self.n, self.seed, self.set_size) = (n, seed, set_size)
+        (self.tightness, self.structure) = (tightness, structure)
+        (self.band, self.cluster_size) = (band, cluster_size)
+        self.violator_size = min(violator_size, n)
+
+    def __iter__(self) -> Iterator[frozenset]:
+        return self.sets()
+
+    def header(self) -> str:
+        return f'# transversal family: n={self.n} universe={self.universe} seed={self.seed} ' \
+               f'set_size={self.set_size[0]}-{self.set_size[1]} tightness={self.tightness} ' \
+               f'structure={self.structure} band={self.band} cluster_size={self.cluster_size} ' \
+               f'violator_size={self.violator_size}'
+
+    def neighborhood(self, center: int) -> Tuple[int, int]:
+        """ (start, size) of the range from which a set whose planted element is center draws. """
+        if self.structure == 'banded':
+            return (center - self.band, 2 * self.band + 1)
+        if self.structure == 'clustered':
+            return (center - center % self.cluster_size, self.cluster_size)
+        return (0, self.universe)
+
+    def planting(self, rng: Random) -> Tuple[int, int]:
+        """
+        (a, b) such that i -> (a*i + b) % universe is one-to-one. That gives each set its own
+        planted element without storing a permutation of the universe.
+        """
+        a = rng.randrange(1, self.universe) if self.universe > 1 else 1
+        while gcd(a, self.universe) != 1:
+            a += 1
+        return (a, rng.randrange(self.universe))
+
+    def sets(self) -> Iterator[frozenset]:
+        """ Generate the sets, one at a time. The same seed always generates the same family. """
+        rng = Random(self.seed)
+        (a, b) = self.planting(rng)
+        # The sets in the planted (tight or infeasible) subfamily, and the elements they may use.
+        special = set(rng.sample(range(self.n), self.violator_size)) if self.tightness != 'feasible' else set()
+        if self.tightness == 'infeasible':
+            special_elements = rng.sample(range(self.universe), self.violator_size - 1)
+        else:
+            special_elements = [(a * i + b) % self.universe for i in sorted(special)]
+
+        for i in range(self.n):
+            size = rng.randint(*self.set_size)
+            planted = (a * i + b) % self.universe
+            if i in special:
+                if self.tightness == 'infeasible':
+                    yield frozenset(rng.sample(special_elements, min(size, len(special_elements))))
+                else:
+                    # A tight set always has its planted element, so Hall's condition holds.
+                    others = [x for x in special_elements if x != planted]
+                    yield frozenset([planted] + rng.sample(others, min(size - 1, len(others))))
+                continue
+            elements = {planted} if self.tightness != 'infeasible' else set()
+            (start, width) = self.neighborhood(planted)
+            # The range (taken modulo universe) may have fewer elements than the drawn size.
+            size = min(size, width, self.universe)
+            while len(elements) < size:
+                elements.add((start + rng.randrange(width)) % self.universe)
+            yield frozenset(elements)
+
+    def write(self, file_name: str) -> int:
+        """ Write the family to file_name. Return the number of sets written. """
+        return write_family(self.sets(), file_name, self.header())
+
+
+def open_family_file(file_name: str, mode: str):
+    return gzip.open(file_name, mode + 't') if file_name.endswith('.gz') else open(file_name, mode)
+
+
+def read_family(file_name: str) -> Iterator[frozenset]:
+    """ Generate the sets in a family file, one at a time. """
+    with open_family_file(file_name, 'r') as family:
+        for line in family:
+            if line.startswith('#'): continue
+            (elements, x) = ([], 0)
+            for delta in line.split():
+                x += int(delta)
+                elements.append(x)
+            yield frozenset(elements)
+
+
+def read_header(file_name: str) -> Dict[str, str]:
+    """ The key=value pairs in a family file's header. """
+    with open_family_file(file_name, 'r') as family:
+        line = family.readline()
+    return dict(item.split('=', 1) for item in line.split() if '=' in item)
+
+
+def write_family(sets: Iterable[Iterable[int]], file_name: str, header='# transversal family') -> int:
+    """ Write sets, one per line, delta-encoded. Return the number of sets written. """
+    count = 0
+    with open_family_file(file_name, 'w') as family:
+        family.write(header + '\n')
+        for s in sets:
+            elements = sorted(s)
+            deltas: List[int] = [b - a for (a, b) in zip([0] + elements, elements)]
+            family.write(' '.join(map(str, deltas)) + '\n')
+            count += 1
+    return count
+
+
+if __name__ == '__main__':
+    print('Small families: is there a transversal?')
+    for tightness in Transversal_Generator.tightnesses:
+        for structure in Transversal_Generator.structures:
+            generator = Transversal_Generator(1000, universe=1200, seed=7, tightness=tightness, structure=structure)
+            sets = list(generator)
+            assert sets == list(generator)
+            matching = Transversal_Matching(sets)
+            print(f'{tightness:>10} {structure:>9}: feasible: {matching.is_feasible()}; '
+                  f'mean set size: {sum(map(len, sets)) / len(sets):.2f}')
+
+    # Set sizes larger than the universe are capped at it.
+    sets = list(Transversal_Generator(3, universe=3, structure='banded', set_size=(4, 5)))
+    print(f'3 sets of sizes 4 to 5 from a universe of 3: {[sorted(s) for s in sets]}')
+
+    file_name = path.join(gettempdir(), 'transversal_family.txt.gz')
+    generator = Transversal_Generator(1_000_000, universe=10**9, seed=1, set_size=(3, 8), structure='banded')
+    start = perf_counter()
+    count = generator.write(file_name)
+    print(f'\nWrote {count} sets to {file_name} ({path.getsize(file_name) / 2**20:.1f} MB) '
+          f'in {perf_counter() - start:.1f} seconds.')
+    start = perf_counter()
+    sizes = sum(len(s) for s in read_family(file_name))
+    print(f'Read them back ({sizes} elements) in {perf_counter() - start:.1f} seconds. Header: {read_header(file_name)}')
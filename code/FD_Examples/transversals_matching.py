@@ -0,0 +1,344 @@
+from __future__ import annotations
+
+from collections import deque
+from random import Random
+from time import perf_counter
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from solver import Solver_FD, Var_FD
+import transversals_FD
+
+"""
+Transversals as bipartite matchings.
+
+A transversal of a family of sets picks a different element from each set. That is
+a matching in the bipartite graph whose left nodes are the sets, whose right nodes
+are the elements, and which has an edge from each set to each of its elements.
+A transversal exists if and only if the maximum matching covers every set.
+
+Hopcroft-Karp finds a maximum matching in O(E * sqrt(V)) time. If it does not cover
+every set, Hall's theorem says there is a subfamily S of sets whose union has fewer
+than |S| elements. That subfamily is returned as the proof that there is no transversal.
+
+All the transversals are enumerated by splitting on edges of a matching: the transversals
+that match set i to element j, and those that don't. A branch is entered only after an
+augmenting-path search has found a matching for it. So every branch produces at least one
+transversal, each transversal is produced exactly once, and the time between one transversal
+and the next is polynomial. They are generated one at a time.
+"""
+
+
+class Transversal_Matching:
+    """
+    Sets may be Var_FD's (including Const_FD's), whose domains are used, or any
+    iterables of hashable elements, e.g., sets of ints or strings.
+    Internally, sets and elements are referred to by their indices.
+    """
+
+    # Distance of a set not (yet) reached by the breadth-first search.
+    unreached = float('inf')
+
+    def __init__(self, sets: Iterable[Union[Var_FD, Iterable[Hashable]]]):
+        self.sets: List[frozenset] = [Transversal_Matching.set_elements(s) for s in sets]
+        self.elements: List[Hashable] = []
+        self.element_index: Dict[Hashable, int] = {}
+        # adj[i] is the list of (indices of) the elements of set i.
+        self.adj: List[List[int]] = [[self.intern(x) for x in s] for s in self.sets]
+        # set_match[i] is the element matched to set i; element_match[j] is the set matched to element j.
+        # -1 means unmatched.
+        self.set_match: List[int] = [-1] * len(self.sets)
+        self.element_match: List[int] = [-1] * len(self.elements)
+        self.dist: List[float] = []
+        self.matching_size = None
+        self.phases = 0
+        # Used when enumerating transversals: the edges not yet excluded, by set and by element.
+        self.allowed: List[Set[int]] = []
+        self.holders: List[Set[int]] = []
+
+    def assign(self, matches: List[int], index: int, value: int, trail: List[Tuple]):
+        """ matches[index] = value, recorded on the trail so that it can be undone. """
+        trail.append((matches, index, matches[index]))
+        matches[index] = value
+
+    def augment_from(self, root: int, next_edge: List[int]) -> bool:
+        """
+        An iterative depth-first search along the BFS layers for an augmenting path from the
+        free set root. If one is found, flip the matching along it. next_edge[i] is the position
+        in adj[i] of the next edge to try from set i. Edges already tried in this phase are not retried.
+        """
+        (adj, dist, element_match) = (self.adj, self.dist, self.element_match)
+        # path_sets[k] is matched (after augmenting) to path_elements[k].
+        (path_sets, path_elements) = ([root], [])
+        while path_sets:
+            i = path_sets[-1]
+            edges = adj[i]
+            while next_edge[i] < len(edges):
+                j = edges[next_edge[i]]
+                next_edge[i] += 1
+                k = element_match[j]
+                if k == -1:
+                    path_elements.append(j)
+                    for (i, j) in zip(path_sets, path_elements):
+                        self.set_match[i] = j
+                        element_match[j] = i
+                    return True
+                if dist[k] == dist[i] + 1:
+                    path_sets.append(k)
+                    path_elements.append(j)
+                    break
+            else:
+                # A dead end. Don't visit set i again in this phase.
+                dist[i] = Transversal_Matching.unreached
+                path_sets.pop()
+                if path_elements:
+                    path_elements.pop()
+        return False
+
+    def augment_in_allowed(self, root: int, trail: List[Tuple]) -> bool:
+        """
+        Breadth-first search, using only allowed edges, for an alternating path from the unmatched
+        set root to a free element. If there is one, flip the matching along it (on the trail).
+        """
+        parent = {root: None}
+        queue = deque([root])
+        while queue:
+            i = queue.popleft()
+            for j in self.allowed[i]:
+                k = self.element_match[j]
+                if k == -1:
+                    # Flip the path back to root.
+                    while i is not None:
+                        next_j = self.set_match[i]
+                        self.assign(self.set_match, i, j, trail)
+                        self.assign(self.element_match, j, i, trail)
+                        (i, j) = (parent[i], next_j)
+                    return True
+                if k not in parent:
+                    parent[k] = i
+                    queue.append(k)
+        return False
+
+    def build_layers(self) -> bool:
+        """
+        Breadth-first search from all free sets along alternating paths. Set dist[i] to i's layer.
+        Stop expanding at the first layer from which a free element can be reached.
+        Return whether there is an augmenting path.
+        """
+        unreached = Transversal_Matching.unreached
+        self.dist = dist = [unreached] * len(self.sets)
+        queue = deque()
+        for i in range(len(self.sets)):
+            if self.set_match[i] == -1:
+                dist[i] = 0
+                queue.append(i)
+        limit = unreached
+        while queue:
+            i = queue.popleft()
+            if dist[i] >= limit: continue
+            for j in self.adj[i]:
+                k = self.element_match[j]
+                if k == -1:
+                    limit = dist[i] + 1
+                elif dist[k] == unreached:
+                    dist[k] = dist[i] + 1
+                    queue.append(k)
+        return limit != unreached
+
+    def find_matching(self) -> int:
+        """ Hopcroft-Karp. Return the size of a maximum matching. """
+        if self.matching_size is not None: return self.matching_size
+        size = self.greedy_matching()
+        while size < len(self.sets) and self.build_layers():
+            self.phases += 1
+            next_edge = [0] * len(self.sets)
+            for i in range(len(self.sets)):
+                if self.set_match[i] == -1 and self.augment_from(i, next_edge):
+                    size += 1
+        self.matching_size = size
+        return size
+
+    def fix_edge(self, i: int, j: int, trail: List[Tuple]):
+        """ Commit to representing set i by element j: drop i's other edges and j's other sets' edges. """
+        for j_2 in list(self.allowed[i]):
+            if j_2 != j: self.remove_edge(i, j_2, trail)
+        for i_2 in list(self.holders[j]):
+            if i_2 != i: self.remove_edge(i_2, j, trail)
+
+    def greedy_matching(self) -> int:
+        """ A quick start: match each set to its first free element. Return the number matched. """
+        size = 0
+        for (i, edges) in enumerate(self.adj):
+            for j in edges:
+                if self.element_match[j] == -1:
+                    (self.set_match[i], self.element_match[j]) = (j, i)
+                    size += 1
+                    break
+        return size
+
+    def hall_violator(self) -> Optional[List[int]]:
+        """
+        None if there is a transversal. Otherwise, the indices of a subfamily of sets
+        whose union has fewer elements than there are sets in it.
+
+        Start from a set the maximum matching leaves unmatched, and follow alternating paths:
+        from a set to each of its elements, from an element to the set matched to it. Every element
+        reached is matched--otherwise there would be an augmenting path. So the sets reached are the
+        unmatched set plus one set per element reached: one more set than elements.
+        """
+        if self.find_matching() == len(self.sets): return None
+        root = self.set_match.index(-1)
+        (reached_sets, reached_elements) = ([root], set())
+        queue = deque([root])
+        while queue:
+            i = queue.popleft()
+            for j in self.adj[i]:
+                if j not in reached_elements:
+                    reached_elements.add(j)
+                    k = self.element_match[j]
+                    reached_sets.append(k)
+                    queue.append(k)
+        return sorted(reached_sets)
+
+    def intern(self, x: Hashable) -> int:
+        if x not in self.element_index:
+            self.element_index[x] = len(self.elements)
+            self.elements.append(x)
+        return self.element_index[x]
+
+    def is_feasible(self) -> bool:
+        return self.find_matching() == len(self.sets)
+
+    def remove_edge(self, i: int, j: int, trail: List[Tuple]):
+        self.allowed[i].discard(j)
+        self.holders[j].discard(i)
+        trail.append((i, j))
+
+    @staticmethod
+    def set_elements(s: Union[Var_FD, Iterable[Hashable]]) -> frozenset:
+        return s.domain if isinstance(s, Var_FD) else frozenset(s)
+
+    def transversal(self) -> Optional[List[Hashable]]:
+        """ The element representing each set, in the order of the sets. None if there is no transversal. """
+        if not self.is_feasible(): return None
+        return [self.elements[j] for j in self.set_match]
+
+    def transversals(self) -> Iterator[Tuple[Hashable, ...]]:
+        """
+        Generate every transversal exactly once, as a tuple of elements in the order of the sets.
+
+        The search runs from an explicit stack, and all changes to the graph and to the matching are
+        recorded on a trail so that they can be undone. At level k, sets 0 .. k-1 have been fixed to
+        their elements. Let j be set k's element in the current matching. If set k has another
+        matching once edge (k, j) is removed, explore that (still at level k). Then undo and explore
+        the transversals in which set k is fixed to j (at level k+1). Otherwise, every transversal in
+        this branch uses (k, j). So fix it and go on to level k+1.
+        """
+        if not self.is_feasible(): return
+        # The edges still allowed, from each set and from each element.
+        self.allowed: List[Set[int]] = [set(edges) for edges in self.adj]
+        self.holders: List[Set[int]] = [set() for _ in self.elements]
+        for (i, edges) in enumerate(self.adj):
+            for j in edges:
+                self.holders[j].add(i)
+        (trail, n) = ([], len(self.sets))
+        # Actions are ('visit', k), ('fix', k), and ('undo', trail length to return to).
+        stack = [('visit', 0)]
+        while stack:
+            (action, k) = stack.pop()
+            if action == 'undo':
+                self.undo_to(k, trail)
+            elif action == 'visit' and k == n:
+                yield tuple(self.elements[j] for j in self.set_match)
+            elif action == 'visit':
+                j = self.set_match[k]
+                mark = len(trail)
+                self.remove_edge(k, j, trail)
+                self.assign(self.set_match, k, -1, trail)
+                self.assign(self.element_match, j, -1, trail)
+                if self.augment_in_allowed(k, trail):
+                    stack += [('fix', k), ('undo', mark), ('visit', k)]
+                else:
+                    self.undo_to(mark, trail)
+                    stack.append(('fix', k))
+            else:
+                # action == 'fix'
+                mark = len(trail)
+                self.fix_edge(k, self.set_match[k], trail)
+                stack += [('undo', mark), ('visit', k + 1)]
+
+    def undo_to(self, mark: int, trail: List[Tuple]):
+        """ Undo the changes on the trail back to length mark. """
+        while len(trail) > mark:
+            entry = trail.pop()
+            if len(entry) == 3:
+                (matches, index, old_value) = entry
+                matches[index] = old_value
+            else:
+                (i, j) = entry
+                self.allowed[i].add(j)
+                self.holders[j].add(i)
+
+    def union_of(self, set_indices: Iterable[int]) -> frozenset:
+        return frozenset().union(*(self.sets[i] for i in set_indices))
+
+
+def all_transversals(sets) -> Iterator[Tuple[Hashable, ...]]:
+    """ Generate the transversals of sets, each exactly once. """
+    yield from Transversal_Matching(sets).transversals()
+
+
+def find_transversal(sets) -> Tuple[Optional[List[Hashable]], Optional[List[int]]]:
+    """
+    (a transversal, None) if there is one.
+    (None, the indices of a Hall-violating subfamily) if there isn't.
+    """
+    matching = Transversal_Matching(sets)
+    return (matching.transversal(), None) if matching.is_feasible() else (None, matching.hall_violator())
+
+
+if __name__ == '__main__':
+    print('Small random families: matching vs. search.')
+    for _ in range(10):
+        sets = transversals_FD.gen_sets(6)
+        (transversal, violator) = find_transversal(sets)
+        solver_fd = transversals_FD.set_up(sets, propagate=True, smallest_first=False)
+        searched = next(solver_fd.solve(), 'none') != 'none'
+        assert searched == (transversal is not None)
+        if transversal:
+            assert len(set(transversal)) == len(sets) and all(x in s.domain for (x, s) in zip(transversal, sets))
+            print(f'{Solver_FD.to_str(sets)}\n    transversal: {transversal}')
+        else:
+            matching = Transversal_Matching(sets)
+            print(f'{Solver_FD.to_str(sets)}\n    no transversal. These {len(violator)} sets have only '
+                  f'{len(matching.union_of(violator))} elements: {Solver_FD.to_str([sets[i] for i in violator])}')
+
+    print('\nAll transversals: enumeration vs. search.')
+    for _ in range(5):
+        sets = transversals_FD.gen_sets(7)
+        enumerated = list(all_transversals(sets))
+        assert len(set(enumerated)) == len(enumerated)
+        solver_fd = transversals_FD.set_up(sets, propagate=True, smallest_first=False)
+        searched = {tuple(v.value for v in sorted(solver_fd.vars, key=lambda v: v.id)) for _ in solver_fd.solve()}
+        assert searched == set(enumerated)
+        print(f'{len(enumerated):>5} transversals; {solver_fd.line_no:>5} search steps.')
+
+    # Streamed: the transversals are counted as they are generated, not stored.
+    sets = [set(range(i, i + 4)) for i in range(12)] + [set(range(0, 15, 2))]
+    start = perf_counter()
+    count = sum(1 for _ in all_transversals(sets))
+    print(f'{len(sets)} sets: {count} transversals in {perf_counter() - start:.2f} seconds.')
+
+    # Large families over ints: each set has its "own" element plus a few random others.
+    # Then squeeze some sets into too few elements to make the family infeasible.
+    rng = Random(0)
+    n = 100_000
+    sets = [{i} | set(rng.sample(range(n), 3)) for i in range(n)]
+    for (label, family) in [('feasible', sets),
+                            ('infeasible', sets[:-20] + [set(rng.sample(range(10), 3)) for _ in range(20)])]:
+        start = perf_counter()
+        matching = Transversal_Matching(family)
+        (feasible, violator) = (matching.is_feasible(), matching.hall_violator())
+        print(f'\n{n} sets ({label}): feasible: {feasible}; phases: {matching.phases}; '
+              f'{perf_counter() - start:.2f} seconds')
+        if violator:
+            print(f'Hall violator: {len(violator)} sets whose union has {len(matching.union_of(violator))} elements.')
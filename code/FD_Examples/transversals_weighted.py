@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+from heapq import heappop, heappush
+from itertools import count
+from math import inf
+from random import Random
+from time import perf_counter
+from typing import Callable, Dict, FrozenSet, Hashable, Iterator, List, Optional, Tuple, Union
+
+from solver import Solver_FD
+from transversals_matching import Transversal_Matching, all_transversals
+import transversals_FD
+
+"""
+Weighted transversals: the assignment problem.
+
+Representing set i by element x costs cost(i, x). The best transversal is a minimum-cost
+matching that covers every set. It is found by successive shortest paths: the sets are added
+one at a time, and each is matched by the cheapest augmenting path, found by Dijkstra's
+algorithm on costs made non-negative by dual potentials. Only the (set, element) pairs that
+exist are looked at, so sparse families are cheap.
+
+The k best transversals are found by Murty's ranking. The transversals that remain after the
+best one are partitioned into subproblems, each with some (set, element) pairs forced and one
+excluded. The best transversal of each subproblem goes on a priority queue. The cheapest one
+on the queue is the next best transversal. It is then partitioned in the same way.
+"""
+
+# (u, v, set_match, element_match): the potentials of the sets and elements and the matching.
+Assignment_State = Tuple[List[float], List[float], List[int], List[int]]
+Cost = Union[Callable[[int, Hashable], Optional[float]], Dict[Tuple[int, Hashable], float]]
+
+
+class Weighted_Transversal:
+    """
+    sets are Var_FD's (including Const_FD's) or iterables of elements, as in Transversal_Matching.
+    costs is either a function cost(i, x) or a dictionary {(i, x): cost}, where i is the index of a set.
+    A pair with no cost (None, or missing from the dictionary with default_cost None) may not be used.
+    """
+
+    def __init__(self, sets, costs: Cost, default_cost: Optional[float] = None):
+        self.matching = Transversal_Matching(sets)
+        (self.sets, self.elements) = (self.matching.sets, self.matching.elements)
+        cost = costs if callable(costs) else lambda i, x: costs.get((i, x), default_cost)
+        # edges[i] is the list of (element index, cost) pairs of set i.
+        self.edges: List[List[Tuple[int, float]]] = []
+        for (i, adj) in enumerate(self.matching.adj):
+            pairs = [(j, cost(i, self.elements[j])) for j in adj]
+            self.edges.append([(j, c) for (j, c) in pairs if c is not None])
+        # costs[i][j] is the cost of representing set i by element j.
+        self.costs: List[Dict[int, float]] = [dict(set_edges) for set_edges in self.edges]
+        # The number of assignment problems solved (from scratch or by repairing a parent's solution).
+        self.solves = 0
+
+    def assignment_cost(self, set_match: List[int]) -> float:
+        return sum(self.costs[i][j] for (i, j) in enumerate(set_match))
+
+    def best(self) -> Optional[Tuple[float, List[Hashable]]]:
+        """ (cost, transversal) for a cheapest transversal, or None if there is no transversal. """
+        self.solves += 1
+        state = min_cost_assignment(self.edges, len(self.elements))
+        return None if state is None else (self.assignment_cost(state[2]), self.to_elements(state[2]))
+
+    def k_best(self, k: Optional[int] = None) -> Iterator[Tuple[float, List[Hashable]]]:
+        """ Generate (cost, transversal) in order of increasing cost: the k best, or all if k is None. """
+        self.solves += 1
+        state = min_cost_assignment(self.edges, len(self.elements))
+        if state is None: return
+        # The queue holds (cost, tie breaker, state, forced pairs (as {set: element}), excluded pairs).
+        tie_breaker = count()
+        queue = [(self.assignment_cost(state[2]), next(tie_breaker), state, {}, frozenset())]
+        produced = 0
+        while queue and (k is None or produced < k):
+            (cost, _, state, forced, excluded) = heappop(queue)
+            set_match = state[2]
+            yield (cost, self.to_elements(set_match))
+            produced += 1
+            # Partition the rest of this subproblem. Child t forces this solution's pairs for the
+            # free sets before t, and excludes its pair for set t.
+            child_forced = dict(forced)
+            for i in range(len(self.sets)):
+                if i in forced: continue
+                child_excluded = excluded | {(i, set_match[i])}
+                child = self.solve_child(state, i, child_forced, child_excluded)
+                if child is not None:
+                    heappush(queue, (self.assignment_cost(child[2]), next(tie_breaker), child,
+                                     dict(child_forced), child_excluded))
+                child_forced[i] = set_match[i]
+
+    def solve_child(self, state: Assignment_State, i: int, forced: Dict[int, int],
+                    excluded: FrozenSet[Tuple[int, int]]) -> Optional[Assignment_State]:
+        """
+        The parent's solution, with set i's pair excluded, repaired by one augmenting path from i.
+        Removing pairs leaves the parent's potentials valid, so one shortest path is all it takes.
+        """
+        self.solves += 1
+        (u, v, set_match, element_match) = (list(x) for x in state)
+        freed = set_match[i]
+        (element_match[freed], set_match[i]) = (-1, -1)
+
+        def allowed(i_2, j):
+            return forced.get(i_2, j) == j and (i_2, j) not in excluded
+
+        child = (u, v, set_match, element_match)
+        return child if augment(self.edges, i, child, allowed, freed) else None
+
+    def to_elements(self, assignment: List[int]) -> List[Hashable]:
+        return [self.elements[j] for j in assignment]
+
+
+def augment(edges: List[List[Tuple[int, float]]], root: int, state: Assignment_State, allowed=None,
+            freed: Optional[int] = None) -> bool:
+    """
+    Match the unmatched set root by a cheapest augmenting path, found by Dijkstra's algorithm on
+    reduced costs c - u[i] - v[j]. Those are never negative, and are zero on matched pairs. Then
+    update the potentials so that that stays true. allowed(i, j), if given, filters the pairs.
+    Return False if root can't be matched.
+
+    Think of the unused elements as matched to dummy sets that may take any element at no cost.
+    That is why every unused element has the same potential, and none has a smaller one.
+    freed, if given, is the element that root just gave up. It is the one element that is really
+    free: the path must end there. Reaching an unused element lets a dummy set move on to any other
+    element, e.g., to freed. That makes the unused element used and leaves freed unused.
+    """
+    (u, v, set_match, element_match) = state
+    root_edges = [(j, c) for (j, c) in edges[root] if allowed is None or allowed(root, j)]
+    if not root_edges: return False
+    u[root] = min(c - v[j] for (j, c) in root_edges)
+    # dist[j] is the reduced length of the cheapest alternating path from root to element j.
+    # via[j] is the set from which that path reaches j (dummy, if from a dummy set).
+    # final lists the elements settled before the end of the path.
+    (dist, via, final, done, heap) = ({}, {}, [], set(), [])
+    (dummy, dummy_entry) = (-1, None)
+    for (j, c) in root_edges:
+        d = c - u[root] - v[j]
+        if d < dist.get(j, inf):
+            (dist[j], via[j]) = (d, root)
+            heappush(heap, (d, j))
+    end = None
+    while heap:
+        (d, j) = heappop(heap)
+        if j in done or d > dist[j]: continue
+        if j == freed or freed is None and element_match[j] == -1:
+            end = j
+            break
+        if element_match[j] == -1:
+            # An unused element: its dummy set (and the others, at no cost) may take any element.
+            dummy_entry = j
+            unused = [j_2 for j_2 in range(len(v)) if element_match[j_2] == -1 and j_2 != freed]
+            for j_2 in unused:
+                dist[j_2] = d
+                done.add(j_2)
+                final.append(j_2)
+            for j_2 in range(len(v)):
+                d_2 = d + v[j] - v[j_2]
+                if j_2 not in done and d_2 < dist.get(j_2, inf):
+                    (dist[j_2], via[j_2]) = (d_2, dummy)
+                    heappush(heap, (d_2, j_2))
+            continue
+        done.add(j)
+        final.append(j)
+        i = element_match[j]
+        for (j_2, c) in edges[i]:
+            if j_2 in done or allowed is not None and not allowed(i, j_2): continue
+            d_2 = d + c - u[i] - v[j_2]
+            if d_2 < dist.get(j_2, inf):
+                (dist[j_2], via[j_2]) = (d_2, i)
+                heappush(heap, (d_2, j_2))
+    if end is None: return False
+
+    # Update the potentials so that the path is tight and no reduced cost goes negative.
+    shortest = dist[end]
+    u[root] += shortest
+    for j in final:
+        v[j] -= shortest - dist[j]
+        if element_match[j] != -1:
+            u[element_match[j]] += shortest - dist[j]
+    # Augment: each set on the path takes the element it reached. An element reached
+    # from a dummy set becomes unused, and the path continues from the dummy's entry.
+    j = end
+    while True:
+        i = via[j]
+        if i == dummy:
+            (element_match[j], j) = (-1, dummy_entry)
+            continue
+        (next_j, set_match[i], element_match[j]) = (set_match[i], j, i)
+        if i == root: return True
+        j = next_j
+
+
+def min_cost_assignment(edges: List[List[Tuple[int, float]]], n_elements: int) -> Optional[Assignment_State]:
+    """
+    Successive shortest augmenting paths. edges[i] lists the (element, cost) pairs of set i.
+    Return the final (u, v, set_match, element_match), or None if some set can't be assigned.
+
+    Start by giving each set, if possible, its cheapest element. Only the sets left over need
+    augmenting paths. (All elements start with potential 0. Unused elements keep it.)
+    """
+    n = len(edges)
+    (u, v, set_match, element_match) = ([0] * n, [0] * n_elements, [-1] * n, [-1] * n_elements)
+    state = (u, v, set_match, element_match)
+    for (i, set_edges) in enumerate(edges):
+        if not set_edges: return None
+        (u[i], j) = min((c, j) for (j, c) in set_edges)
+        if element_match[j] == -1:
+            (set_match[i], element_match[j]) = (j, i)
+    for root in range(n):
+        if set_match[root] == -1 and not augment(edges, root, state): return None
+    return state
+
+
+if __name__ == '__main__':
+    rng = Random(0)
+
+    # Small families of Const_FD's: compare against costing every transversal.
+    for _ in range(5):
+        sets = transversals_FD.gen_sets(6)
+        costs = {(i, x): rng.randint(1, 20) for (i, s) in enumerate(sets) for x in s.domain}
+        weighted = Weighted_Transversal(sets, costs)
+        every = sorted(sum(costs[(i, x)] for (i, x) in enumerate(t)) for t in all_transversals(sets))
+        ranked = list(weighted.k_best())
+        assert [cost for (cost, _) in ranked] == every
+        assert all(sum(costs[(i, x)] for (i, x) in enumerate(t)) == cost for (cost, t) in ranked)
+        best = weighted.best()
+        print(f'{Solver_FD.to_str(sets)}\n    best: {best}; 3 best costs: {every[:3]}; '
+              f'{len(every)} transversals')
+
+    # A large sparse random family. (Its own Random, since gen_sets uses the global one.)
+    (n, rng) = (20_000, Random(1))
+    sets = [{i} | set(rng.sample(range(n), 4)) for i in range(n)]
+    weighted = Weighted_Transversal(sets, lambda i, x: (i * 7919 + x * 104729) % 1000)
+    start = perf_counter()
+    (cost, _) = weighted.best()
+    print(f'\n{n} sets: best cost: {cost}; {perf_counter() - start:.2f} seconds.')
+    start = perf_counter()
+    ranked = [cost for (cost, _) in Weighted_Transversal(sets[:500], lambda i, x: (i + 3 * x) % 97).k_best(5)]
+    print(f'500 sets: 5 best costs: {ranked}; {perf_counter() - start:.2f} seconds.')
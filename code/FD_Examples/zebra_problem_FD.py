@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import sys
+import tracemalloc
+from os import path
+from time import perf_counter
+
+from logic_grid import Logic_Grid
+from scholarship_problem_FD import Clues_Solver
+from solver import All_Different, Solver_FD, Var_FD
+
+"""
+The zebra problem (see the paper's zebra_problem.py) on the FD engine, in two models, and a
+benchmark of both against the paper's unification-based version, run on its logic_variables.py.
+
+There are 5 houses in a row, each with a unique color.
+Each house is occupied by a family of a unique nationality.
+Each family has a pet, a favorite smoke, and a favorite drink.
+
+1. The English live in the red house.
+2. The Spanish have a dog.
+3. They drink coffee in the green house.
+4. The Ukrainians drink tea.
+5. The green house is immediately to the right of the white house.
+6. The Old Gold smokers have snails.
+7. They smoke Kool in the yellow house.
+8. They drink milk in the middle house.
+9. The Norwegians live in the first house on the left.
+10. The Chesterfield smokers live next to the fox.
+11. They smoke Kool in the house next to the horse.
+12. The Lucky smokers drink juice.
+13. The Japanese smoke Parliament.
+14. The Norwegians live next to the blue house.
+
+Who has a zebra and who drinks water?
+
+The positional model (Logic_Grid) gives each value a position var. Each clue is a Binary_FD.
+The structural model is the paper's: a House_FD has a Var_FD per attribute, and each clue is
+a generator that unifies a pattern House_FD with the houses, run by Clues_Solver.
+For the unification model, nodes counts the unifications tried.
+"""
+
+attributes = {'nationality': ['English', 'Japanese', 'Norwegians', 'Spanish', 'Ukrainians'],
+              'smoke': ['Chesterfield', 'Kool', 'Lucky', 'Old Gold', 'Parliament'],
+              'pet': ['dog', 'fox', 'horse', 'snails', 'zebra'],
+              'drink': ['coffee', 'juice', 'milk', 'tea', 'water'],
+              'color': ['blue', 'green', 'red', 'white', 'yellow']}
+
+
+def zebra_grid() -> Logic_Grid:
+    """ The positional model. Position 0 is the first house on the left. """
+    grid = Logic_Grid(attributes)
+    grid.same('English', 'red')                     # 1
+    grid.same('Spanish', 'dog')                     # 2
+    grid.same('coffee', 'green')                    # 3
+    grid.same('Ukrainians', 'tea')                  # 4
+    grid.immediately_before('white', 'green')       # 5
+    grid.same('Old Gold', 'snails')                 # 6
+    grid.same('Kool', 'yellow')                     # 7
+    grid.at_position('milk', 2)                     # 8
+    grid.at_position('Norwegians', 0)               # 9
+    grid.next_to('Chesterfield', 'fox')             # 10
+    grid.next_to('Kool', 'horse')                   # 11
+    grid.same('Lucky', 'juice')                     # 12
+    grid.same('Japanese', 'Parliament')             # 13
+    grid.next_to('Norwegians', 'blue')              # 14
+    return grid
+
+
+class House_FD(Var_FD):
+    """ A house: a Var_FD for each attribute. A pattern house leaves the unmentioned ones open. """
+
+    id = 0
+
+    def __init__(self, **values):
+        self.attributes = {attribute: Var_FD(values.get(attribute, all_values))
+                           for (attribute, all_values) in attributes.items()}
+        super().__init__()
+
+    def __str__(self):
+        return '/'.join('-'.join(sorted(var.domain)) + var.star_or_dash() for var in self.attributes.values())
+
+    def narrow_domain(self, other: House_FD):
+        """ Narrow each attribute. """
+        yield from Solver_FD.unify_pairs_FD([(self.attributes[attribute], other.attributes[attribute])
+                                             for attribute in attributes])
+
+
+class Const_House_FD(House_FD):
+
+    def narrow_domain(self, other: House_FD):
+        """ As with Const_Stdnt: a pattern narrows a house, not the other way around. """
+        if type(other) == House_FD:
+            yield from other.narrow_domain(self)
+
+
+def next_to_in(a: House_FD, b: House_FD, houses):
+    yield from Solver_FD.is_contiguous_in([a, b], houses)
+    yield from Solver_FD.is_contiguous_in([b, a], houses)
+
+
+def clue_1(houses):
+    """ 1. The English live in the red house. """
+    yield from Const_House_FD(nationality='English', color='red').member_FD(houses)
+
+
+def clue_2(houses):
+    """ 2. The Spanish have a dog. """
+    yield from Const_House_FD(nationality='Spanish', pet='dog').member_FD(houses)
+
+
+def clue_3(houses):
+    """ 3. They drink coffee in the green house. """
+    yield from Const_House_FD(drink='coffee', color='green').member_FD(houses)
+
+
+def clue_4(houses):
+    """ 4. The Ukrainians drink tea. """
+    yield from Const_House_FD(nationality='Ukrainians', drink='tea').member_FD(houses)
+
+
+def clue_5(houses):
+    """ 5. The green house is immediately to the right of the white house. """
+    yield from Solver_FD.is_contiguous_in([Const_House_FD(color='white'), Const_House_FD(color='green')], houses)
+
+
+def clue_6(houses):
+    """ 6. The Old Gold smokers have snails. """
+    yield from Const_House_FD(smoke='Old Gold', pet='snails').member_FD(houses)
+
+
+def clue_7(houses):
+    """ 7. They smoke Kool in the yellow house. """
+    yield from Const_House_FD(smoke='Kool', color='yellow').member_FD(houses)
+
+
+def clue_8(houses):
+    """ 8. They drink milk in the middle house. """
+    yield from houses[2].narrow_domain(Const_House_FD(drink='milk'))
+
+
+def clue_9(houses):
+    """ 9. The Norwegians live in the first house on the left. """
+    yield from houses[0].narrow_domain(Const_House_FD(nationality='Norwegians'))
+
+
+def clue_10(houses):
+    """ 10. The Chesterfield smokers live next to the fox. """
+    yield from next_to_in(Const_House_FD(smoke='Chesterfield'), Const_House_FD(pet='fox'), houses)
+
+
+def clue_11(houses):
+    """ 11. They smoke Kool in the house next to the horse. """
+    yield from next_to_in(Const_House_FD(smoke='Kool'), Const_House_FD(pet='horse'), houses)
+
+
+def clue_12(houses):
+    """ 12. The Lucky smokers drink juice. """
+    yield from Const_House_FD(drink='juice', smoke='Lucky').member_FD(houses)
+
+
+def clue_13(houses):
+    """ 13. The Japanese smoke Parliament. """
+    yield from Const_House_FD(nationality='Japanese', smoke='Parliament').member_FD(houses)
+
+
+def clue_14(houses):
+    """ 14. The Norwegians live next to the blue house. """
+    yield from next_to_in(Const_House_FD(nationality='Norwegians'), Const_House_FD(color='blue'), houses)
+
+
+clues = [clue_1, clue_2, clue_3, clue_4, clue_5, clue_6, clue_7, clue_8, clue_9, clue_10,
+         clue_11, clue_12, clue_13, clue_14]
+
+
+def answer(rows) -> str:
+    """ rows is [{attribute: value} for each house]. """
+    zebra = next(row['nationality'] for row in rows if row['pet'] == 'zebra')
+    water = next(row['nationality'] for row in rows if row['drink'] == 'water')
+    return f'The {zebra} own a zebra, and the {water} drink water.'
+
+
+def solve_positional():
+    """ Return (the solutions, the number of search nodes). """
+    grid = zebra_grid()
+    solver = grid.solver()
+    solutions = list(grid.solutions(solver=solver))
+    return (solutions, solver.line_no)
+
+
+def solve_structural(dynamic=True, shave=True):
+    """ Return (the solutions, the number of search nodes). """
+    Solver_FD.set_up()
+    houses = [House_FD() for _ in range(5)]
+    for attribute in attributes:
+        All_Different({house.attributes[attribute] for house in houses})
+    vars = {var for house in houses for var in house.attributes.values()}
+    solver = Clues_Solver(vars, houses, clues, dynamic=dynamic, shave=shave)
+    solutions = [[{attribute: var.value for (attribute, var) in house.attributes.items()} for house in houses]
+                 for _ in solver.solve()]
+    return (solutions, solver.line_no)
+
+
+def solve_unification():
+    """
+    The paper's model (see its zebra_problem.py), built directly on its logic_variables.py: a House
+    is a StructureItem, and each clue unifies pattern Houses with the houses. Its member,
+    next_to_in, and is_contiguous_in (from sequence_options, not in this repository) are written
+    here over Python lists. Return (the solutions, the number of unifications tried).
+    """
+    src = path.join(path.dirname(path.abspath(__file__)), '..', '..', 'WI-2020', 'WI-2020 Latex sources',
+                    'WI 2020 paper', 'src')
+    sys.path.insert(0, path.abspath(src))
+    try:
+        from logic_variables import StructureItem, unify, unify_pairs
+    finally:
+        sys.path.pop(0)
+
+    class House(StructureItem):
+        def __init__(self, nationality=None, smoke=None, pet=None, drink=None, color=None):
+            super().__init__((nationality, smoke, pet, drink, color))
+
+    unifications = 0
+
+    def is_contiguous_in(items, houses):
+        nonlocal unifications
+        for i in range(len(houses) - len(items) + 1):
+            unifications += 1
+            yield from unify_pairs(list(zip(items, houses[i:i + len(items)])))
+
+    def member(item, houses):
+        yield from is_contiguous_in([item], houses)
+
+    def next_to_in(a, b, houses):
+        yield from is_contiguous_in([a, b], houses)
+        yield from is_contiguous_in([b, a], houses)
+
+    houses = [House() for _ in range(5)]
+    unification_clues = [
+        lambda: member(House(nationality='English', color='red'), houses),                      # 1
+        lambda: member(House(nationality='Spanish', pet='dog'), houses),                        # 2
+        lambda: member(House(drink='coffee', color='green'), houses),                           # 3
+        lambda: member(House(nationality='Ukrainians', drink='tea'), houses),                   # 4
+        lambda: is_contiguous_in([House(color='white'), House(color='green')], houses),         # 5
+        lambda: member(House(smoke='Old Gold', pet='snails'), houses),                          # 6
+        lambda: member(House(smoke='Kool', color='yellow'), houses),                            # 7
+        lambda: unify(House(drink='milk'), houses[2]),                                          # 8
+        lambda: unify(House(nationality='Norwegians'), houses[0]),                              # 9
+        lambda: next_to_in(House(smoke='Chesterfield'), House(pet='fox'), houses),              # 10
+        lambda: next_to_in(House(smoke='Kool'), House(pet='horse'), houses),                    # 11
+        lambda: member(House(drink='juice', smoke='Lucky'), houses),                            # 12
+        lambda: member(House(nationality='Japanese', smoke='Parliament'), houses),              # 13
+        lambda: next_to_in(House(nationality='Norwegians'), House(color='blue'), houses),       # 14
+        # 15 (implicit). Fill in the unmentioned values.
+        lambda: member(House(pet='zebra'), houses),
+        lambda: member(House(drink='water'), houses)]
+
+    def run(index):
+        if index == len(unification_clues):
+            yield
+        else:
+            for _ in unification_clues[index]():
+                yield from run(index + 1)
+
+    solutions = [[{attribute: arg.get_py_value() for (attribute, arg) in zip(attributes, house.args)}
+                  for house in houses]
+                 for _ in run(0)]
+    return (solutions, unifications)
+
+
+def benchmark(solve, repeats=5):
+    """ Return (solve( )'s result, the best seconds of repeats runs, peak memory (bytes) of one run). """
+    best = None
+    for _ in range(repeats):
+        start = perf_counter()
+        result = solve()
+        seconds = perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    tracemalloc.start()
+    solve()
+    (_, peak) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (result, best, peak)
+
+
+if __name__ == '__main__':
+    (solutions, _) = solve_positional()
+    for (i, row) in enumerate(solutions[0]):
+        print(f'    {i + 1}. {row["nationality"]}({row["smoke"]}, {row["pet"]}, {row["drink"]}, {row["color"]})')
+    print(f'    {answer(solutions[0])}\n')
+
+    engines = [('FD positional (Logic_Grid)', solve_positional),
+               ('FD structural (Clues_Solver, scheduled and shaved)', solve_structural),
+               ('FD structural (Clues_Solver, clues in order)', lambda: solve_structural(dynamic=False, shave=False)),
+               ('Unification (the paper\'s model, logic_variables.py)', solve_unification)]
+    print(f'{"":52}{"solutions":>10}{"nodes":>8}{"ms":>9}{"peak KB":>10}')
+    for (name, solve) in engines:
+        ((solutions, nodes), seconds, peak) = benchmark(solve)
+        print(f'{name:52}{len(solutions):>10}{nodes:>8}{seconds * 1000:>9.1f}{peak / 1024:>10.0f}')
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+from math import exp
+from random import Random
+from time import perf_counter
+from typing import Dict, Iterable, List, Optional
+
+from solver import All_Different, Solver_FD, Var_FD
+
+
+class Local_Search_FD:
+    """
+    A local-search engine for models built from Var_FD's and All_Different.
+
+    Unlike Solver_FD, it is not complete. Each var always holds one value from its
+    domain, and the search repairs the assignment until no All_Different sibling pair
+    shares a value--or until the steps, restarts, or time run out. The best assignment
+    seen so far is always available in self.best.
+    """
+
+    methods = ('min_conflicts', 'tabu', 'annealing')
+
+    def __init__(self, vars: Iterable[Var_FD], seed=None, time_limit: Optional[float] = None, trace=False):
+        # Sort by id so that a given seed always produces the same search.
+        self.vars: List[Var_FD] = sorted(vars, key=lambda v: v.id)
+        self.rng = Random(seed)
+        self.time_limit = time_limit
+        self.trace = trace
+
+        # The candidate values of each var are its domain when the search is set up.
+        self.candidates: Dict[Var_FD, List] = {v: sorted(v.domain, key=str) for v in self.vars}
+        # sibs is All_Different.sibs_dict restricted to self.vars.
+        var_set = set(self.vars)
+        self.sibs: Dict[Var_FD, List[Var_FD]] = {v: [w for w in All_Different.sibs_dict.get(v, ()) if w in var_set]
+                                                 for v in self.vars}
+
+        # self.value[v] is the value currently assigned to v.
+        # self.sib_counts[v][x] is the number of v's siblings currently assigned x.
+        # So v is in conflict with self.sib_counts[v][self.value[v]] of its siblings.
+        self.value: Dict[Var_FD, object] = {}
+        self.sib_counts: Dict[Var_FD, Dict[object, int]] = {}
+        # The number of sibling pairs that share a value.
+        self.violations = 0
+
+        # The vars with at least one conflict, kept as a list plus a position index
+        # so that a random conflicted var can be picked in constant time.
+        self.conflicted: List[Var_FD] = []
+        self.conflicted_pos: Dict[Var_FD, int] = {}
+
+        self.best: Dict[Var_FD, object] = {}
+        self.best_violations = None
+        self.restarts = 0
+        self.steps = 0
+        self.start_time = None
+
+    def assign(self, var: Var_FD, new_value):
+        """ Give var new_value, updating the violation counts of var and its siblings. """
+        old_value = self.value[var]
+        if new_value == old_value: return
+        self.violations += self.sib_counts[var].get(new_value, 0) - self.sib_counts[var].get(old_value, 0)
+        self.value[var] = new_value
+        for w in self.sibs[var]:
+            w_counts = self.sib_counts[w]
+            w_counts[old_value] -= 1
+            w_counts[new_value] = w_counts.get(new_value, 0) + 1
+            self.update_conflicted(w)
+        self.update_conflicted(var)
+
+    def conflicts(self, var: Var_FD, value=None) -> int:
+        """ The number of var's siblings that have value (by default, var's current value). """
+        return self.sib_counts[var].get(self.value[var] if value is None else value, 0)
+
+    def initialize(self):
+        """ A greedy random start: visit the vars in random order, giving each a least-conflicting value. """
+        self.value = {}
+        self.sib_counts = {v: {} for v in self.vars}
+        self.violations = 0
+        (self.conflicted, self.conflicted_pos) = ([], {})
+        order = self.vars[:]
+        self.rng.shuffle(order)
+        for v in order:
+            value = self.least_conflicting_value(v)
+            self.value[v] = value
+            self.violations += self.sib_counts[v].get(value, 0)
+            for w in self.sibs[v]:
+                w_counts = self.sib_counts[w]
+                w_counts[value] = w_counts.get(value, 0) + 1
+        for v in self.vars:
+            self.update_conflicted(v)
+
+    def install_best(self):
+        """ Narrow the domain of each var to its value in the best assignment found. """
+        for (v, value) in self.best.items():
+            v.set_init_domain(frozenset({value}))
+
+    def is_out_of_time(self) -> bool:
+        return self.time_limit is not None and perf_counter() - self.start_time >= self.time_limit
+
+    def least_conflicting_value(self, var: Var_FD):
+        """ A value for var with the fewest conflicts. Ties are broken randomly. """
+        counts = self.sib_counts[var]
+        best_values = []
+        best_count = None
+        for x in self.candidates[var]:
+            count = counts.get(x, 0)
+            if best_count is None or count < best_count:
+                (best_values, best_count) = ([x], count)
+            elif count == best_count:
+                best_values.append(x)
+        return self.rng.choice(best_values) if best_values else self.value[var]
+
+    def record_if_best(self):
+        if self.best_violations is None or self.violations < self.best_violations:
+            self.best = dict(self.value)
+            self.best_violations = self.violations
+            if self.trace: print(f'{self.steps:>8}. violations: {self.violations}')
+
+    def run_annealing(self, max_steps, start_temperature=2.0, cooling=0.999):
+        """
+        Simulated annealing: move a random conflicted var to a random value, accepting
+        a move that adds delta conflicts with probability exp(-delta/T).
+        """
+        temperature = start_temperature
+        for _ in range(max_steps):
+            if not self.violations or self.is_out_of_time(): return
+            self.steps += 1
+            var = self.rng.choice(self.conflicted)
+            new_value = self.rng.choice(self.candidates[var])
+            delta = self.conflicts(var, new_value) - self.conflicts(var)
+            if delta <= 0 or self.rng.random() < exp(-delta / temperature):
+                self.assign(var, new_value)
+                self.record_if_best()
+            temperature = max(temperature * cooling, 1e-3)
+
+    def run_min_conflicts(self, max_steps, noise=0.05):
+        """ Min-conflicts: repeatedly move a random conflicted var to a least-conflicting value. """
+        for _ in range(max_steps):
+            if not self.violations or self.is_out_of_time(): return
+            self.steps += 1
+            var = self.rng.choice(self.conflicted)
+            new_value = self.rng.choice(self.candidates[var]) if self.rng.random() < noise else \
+                        self.least_conflicting_value(var)
+            self.assign(var, new_value)
+            self.record_if_best()
+
+    def run_tabu(self, max_steps, tenure=None):
+        """
+        Tabu search: make the best move among the conflicted vars, even if it worsens things.
+        Moving a var away from a value makes it tabu to return there for tenure steps--unless
+        doing so would beat the best assignment found (aspiration).
+        """
+        tenure = tenure if tenure is not None else max(2, len(self.vars) // 10)
+        # tabu_until[(var, value)] is the step until which var may not return to value.
+        tabu_until = {}
+        for _ in range(max_steps):
+            if not self.violations or self.is_out_of_time(): return
+            self.steps += 1
+            best_moves = []
+            best_delta = None
+            for var in self.conflicted:
+                current = self.conflicts(var)
+                for x in self.candidates[var]:
+                    if x == self.value[var]: continue
+                    delta = self.conflicts(var, x) - current
+                    is_tabu = tabu_until.get((var, x), 0) > self.steps
+                    if is_tabu and self.violations + delta >= self.best_violations: continue
+                    if best_delta is None or delta < best_delta:
+                        (best_moves, best_delta) = ([(var, x)], delta)
+                    elif delta == best_delta:
+                        best_moves.append((var, x))
+            if not best_moves: continue
+            (var, new_value) = self.rng.choice(best_moves)
+            tabu_until[(var, self.value[var])] = self.steps + tenure
+            self.assign(var, new_value)
+            self.record_if_best()
+
+    def solve(self, method='min_conflicts', max_steps=10000, restarts=10, **options) -> Dict[Var_FD, object]:
+        """
+        Search with method, restarting from a fresh random assignment after every max_steps
+        steps, at most restarts times. options are passed on to the run_<method> function.
+        Return the best assignment found. self.best_violations is 0 if it is a solution.
+        """
+        assert method in Local_Search_FD.methods, f'Unknown method: {method}. Use one of {Local_Search_FD.methods}.'
+        run_method = getattr(self, f'run_{method}')
+        self.start_time = perf_counter()
+        (self.best, self.best_violations, self.restarts, self.steps) = ({}, None, 0, 0)
+        for self.restarts in range(restarts + 1):
+            self.initialize()
+            self.record_if_best()
+            run_method(max_steps, **options)
+            if self.best_violations == 0 or self.is_out_of_time(): break
+        return self.best
+
+    def state_string(self) -> str:
+        seconds = perf_counter() - self.start_time if self.start_time else 0
+        return f'violations: {self.best_violations}; steps: {self.steps}; ' \
+               f'restarts: {self.restarts}; seconds: {seconds:.2f}'
+
+    def update_conflicted(self, var: Var_FD):
+        """ Keep var in self.conflicted if and only if it has a conflict. """
+        in_conflict = self.conflicts(var) > 0
+        if in_conflict and var not in self.conflicted_pos:
+            self.conflicted_pos[var] = len(self.conflicted)
+            self.conflicted.append(var)
+        elif not in_conflict and var in self.conflicted_pos:
+            # Move the last element into var's slot.
+            pos = self.conflicted_pos.pop(var)
+            last = self.conflicted.pop()
+            if last is not var:
+                self.conflicted[pos] = last
+                self.conflicted_pos[last] = pos
+
+
+if __name__ == '__main__':
+    # A transversal problem too large for complete search:
+    # each of n sets contains its "own" element plus a few random others.
+    n = 300
+    rng = Random(0)
+    Solver_FD.set_up()
+    vars = [Var_FD({i} | set(rng.sample(range(n), 3))) for i in range(n)]
+    All_Different(set(vars))
+
+    for method in Local_Search_FD.methods:
+        local_search = Local_Search_FD(vars, seed=1, time_limit=10)
+        local_search.solve(method=method, max_steps=20000, restarts=5)
+        print(f'{method:>14}: {local_search.state_string()}')
@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+from random import Random
+from time import perf_counter
+from typing import Dict, Hashable, Iterable, List, Optional
+
+from solver import All_Different, Binary_FD, Const_FD, Solver_FD, Var_FD
+
+"""
+A compiler from a logic-grid puzzle's description to an FD model.
+
+A logic-grid puzzle has n positions (houses in a row, scholarship amounts, ...) and some
+attributes (nationality, pet, ...), each with n values. Each value of each attribute is at
+exactly one position. The model has two views of that:
+    position[value]      a Var_FD over range(n): where value is (attribute -> position).
+    at[attribute][p]     a Var_FD over the attribute's values: what is at position p
+                         (position -> attribute).
+Each view has an All_Different per attribute. A Channel_FD per attribute keeps the two views
+inverse: position[value] == p if and only if at[attribute][p] == value. A Grid_FD propagates
+the channels and the clues together.
+
+Clues are Binary_FD's on the position vars, e.g., grid.next_to('Chesterfield', 'fox').
+Values are referred to by name, so they must be distinct across attributes. (Otherwise,
+use (attribute, value) pairs as the values.)
+"""
+
+
+class Channel_FD:
+    """
+    Keeps positions (value -> its position var) and at (position -> its value var) inverse
+    for one attribute: removes p from position[v] if v can't be at p, and v from at[p] if
+    v's position can't be p.
+    """
+
+    def __init__(self, positions: Dict[Hashable, Var_FD], at: List[Var_FD]):
+        (self.positions, self.at) = (positions, at)
+        self.vars = list(positions.values()) + at
+
+    def revise(self, domains: Dict[Var_FD, frozenset]) -> Optional[Dict[Var_FD, frozenset]]:
+        """ As in Binary_FD: {var: its narrower domain} for the vars that narrow. None if one would be empty. """
+        revised = {}
+        for (value, var) in self.positions.items():
+            new_domain = frozenset(p for p in domains[var] if value in domains[self.at[p]])
+            if not new_domain: return None
+            if len(new_domain) < len(domains[var]): revised[var] = new_domain
+        for (p, var) in enumerate(self.at):
+            new_domain = frozenset(value for value in domains[var] if p in domains[self.positions[value]])
+            if not new_domain: return None
+            if len(new_domain) < len(domains[var]): revised[var] = new_domain
+        return revised
+
+
+class Grid_FD:
+    """
+    A propagator for all of a grid's channels and clues together. narrow( ) revises them to a
+    fixpoint on a copy of the domains (AC-3: when a var narrows, the constraints on it are revised
+    again), and only then narrows the vars, all at once.
+
+    Giving each clue its own place in Solver_FD's propagators would nest a generator per clue per
+    round, which for a big grid is deeper than Python's stack.
+    """
+
+    def __init__(self, constraints: List):
+        self.constraints = constraints
+        # constraints_on[var] lists the constraints on var.
+        self.constraints_on: Dict[Var_FD, List] = {}
+        for constraint in constraints:
+            for var in Grid_FD.constraint_vars(constraint):
+                self.constraints_on.setdefault(var, []).append(constraint)
+        # The domains as of the end of the last narrow( ). Only constraints on vars that have
+        # narrowed since (e.g., by being instantiated) need to be revised.
+        self.last_domains: Optional[Dict[Var_FD, frozenset]] = None
+
+    @staticmethod
+    def constraint_vars(constraint) -> List[Var_FD]:
+        return constraint.vars if isinstance(constraint, Channel_FD) else [constraint.x, constraint.y]
+
+    def narrow(self):
+        """ Yield True if some domain was narrowed, False if none was. Fail if some domain would be empty. """
+        last_domains = self.last_domains
+        domains = {var: var.domain for var in self.constraints_on}
+        if last_domains is None:
+            queue = list(self.constraints)
+        else:
+            changed = [var for var in domains if domains[var] is not last_domains[var]]
+            queue = list({id(c): c for var in changed for c in self.constraints_on[var]}.values())
+        queued = {id(constraint) for constraint in queue}
+        while queue:
+            constraint = queue.pop()
+            queued.discard(id(constraint))
+            revised = constraint.revise(domains)
+            if revised is None: return
+            for (var, new_domain) in revised.items():
+                domains[var] = new_domain
+                for other in self.constraints_on[var]:
+                    if other is not constraint and id(other) not in queued:
+                        queued.add(id(other))
+                        queue.append(other)
+        narrowed = [(var, Const_FD(domain)) for (var, domain) in domains.items() if domain is not var.domain]
+        for _ in Solver_FD.narrow_domains(narrowed):
+            # narrow_domain makes new frozensets. Remember the ones the vars now have.
+            self.last_domains = {var: var.domain for var in domains}
+            yield bool(narrowed)
+        self.last_domains = last_domains
+
+
+class Logic_Grid:
+    """
+    attributes is {attribute: its values}. Each attribute has n_positions values. (If n_positions
+    is None, it is the number of values of the first attribute.)
+    Building a Logic_Grid resets the FD globals (Solver_FD.set_up( )).
+    """
+
+    def __init__(self, attributes: Dict[str, Iterable], n_positions: Optional[int] = None):
+        Solver_FD.set_up()
+        self.attributes: Dict[str, List] = {attribute: sorted(values, key=str)
+                                            for (attribute, values) in attributes.items()}
+        self.n = n_positions if n_positions is not None else len(next(iter(self.attributes.values()), []))
+        # attribute_of[value] is the attribute value is a value of.
+        self.attribute_of: Dict[Hashable, str] = {}
+        self.position: Dict[Hashable, Var_FD] = {}
+        self.at: Dict[str, List[Var_FD]] = {}
+        self.channels: List[Channel_FD] = []
+        for (attribute, values) in self.attributes.items():
+            assert len(values) == self.n, f'{attribute} has {len(values)} values, not {self.n}.'
+            for value in values:
+                assert value not in self.attribute_of, \
+                    f'{value} is a value of both {self.attribute_of[value]} and {attribute}.'
+                self.attribute_of[value] = attribute
+                self.position[value] = Var_FD(range(self.n), var_name=str(value))
+            self.at[attribute] = [Var_FD(values, var_name=f'{attribute}{p}') for p in range(self.n)]
+            attribute_positions = {value: self.position[value] for value in values}
+            All_Different(set(attribute_positions.values()))
+            All_Different(set(self.at[attribute]))
+            self.channels.append(Channel_FD(attribute_positions, self.at[attribute]))
+        self.clues: List[Binary_FD] = []
+
+    def __str__(self):
+        width = max((len(str(value)) for value in self.attribute_of), default=0)
+        rows = [f'{p:>3}. ' + '  '.join(f'{Solver_FD.to_str(self.at[attribute][p].domain):<{width}}'
+                                        for attribute in self.attributes)
+                for p in range(self.n)]
+        return '\n'.join(rows)
+
+    def add(self, clue: Binary_FD) -> Binary_FD:
+        self.clues.append(clue)
+        return clue
+
+    # Clues. Each adds a Binary_FD on the positions of its values and returns it.
+    def at_position(self, value, p) -> Binary_FD:
+        return self.add(Binary_FD.at(self.position[value], p))
+
+    def before(self, value_1, value_2) -> Binary_FD:
+        return self.add(Binary_FD.before(self.position[value_1], self.position[value_2]))
+
+    def different(self, value_1, value_2) -> Binary_FD:
+        return self.add(Binary_FD.different(self.position[value_1], self.position[value_2]))
+
+    def immediately_before(self, value_1, value_2) -> Binary_FD:
+        return self.add(Binary_FD.immediately_before(self.position[value_1], self.position[value_2]))
+
+    def next_to(self, value_1, value_2) -> Binary_FD:
+        return self.add(Binary_FD.next_to(self.position[value_1], self.position[value_2]))
+
+    def offset(self, value_1, value_2, k) -> Binary_FD:
+        """ value_2 is k positions after value_1. """
+        return self.add(Binary_FD.offset(self.position[value_1], self.position[value_2], k))
+
+    def same(self, value_1, value_2) -> Binary_FD:
+        return self.add(Binary_FD.same(self.position[value_1], self.position[value_2]))
+
+    def solution(self) -> List[Dict[str, Hashable]]:
+        """ [{attribute: value} for each position]. Call when all the vars are instantiated. """
+        return [{attribute: self.at[attribute][p].value for attribute in self.attributes} for p in range(self.n)]
+
+    def solver(self, time_limit=None, trace=False) -> Solver_FD:
+        """ A Solver_FD for the model: both views, the channels, and the clues. """
+        vars = set(self.position.values()) | {var for at in self.at.values() for var in at}
+        return Solver_FD(vars, propagators=[Grid_FD(self.channels + self.clues)], time_limit=time_limit, trace=trace)
+
+    def solutions(self, limit: Optional[int] = None, solver: Optional[Solver_FD] = None) \
+            -> Iterable[List[Dict[str, Hashable]]]:
+        """ Generate the solutions (up to limit of them), using solver if given. """
+        count = 0
+        for _ in (solver or self.solver()).solve():
+            yield self.solution()
+            count += 1
+            if count == limit: return
+
+
+def random_grid_puzzle(n_attributes: int, n: int, seed=None):
+    """
+    A random logic-grid puzzle with a unique solution. Pick a hidden solution. Then add random clues
+    true of it, n at a time, until only it is left. Return (the Logic_Grid, the hidden solution).
+
+    Around the point where the clues first nearly pin down the solution, some searches take very
+    long. A search that runs out of time counts as not unique, and more clues are added.
+    """
+    rng = Random(seed)
+    attributes = {f'a{k}': [f'a{k}_{i}' for i in range(n)] for k in range(n_attributes)}
+    hidden = {value: p for values in attributes.values() for (p, value) in enumerate(rng.sample(values, n))}
+    values = sorted(hidden)
+    # The relation each kind of clue requires of the hidden positions.
+    kinds = {'same': lambda p_1, p_2: p_1 == p_2, 'next_to': lambda p_1, p_2: abs(p_1 - p_2) == 1,
+             'immediately_before': lambda p_1, p_2: p_2 == p_1 + 1, 'before': lambda p_1, p_2: p_1 < p_2,
+             'different': lambda p_1, p_2: p_1 != p_2}
+    clues = []
+    while True:
+        grid = Logic_Grid(attributes)
+        for (kind, value_1, value_2) in clues:
+            getattr(grid, kind)(value_1, value_2)
+        solver = grid.solver(time_limit=1)
+        if len(list(grid.solutions(limit=2, solver=solver))) == 1 and not solver.timed_out: return (grid, hidden)
+        added = 0
+        while added < n:
+            (kind, value_1) = (rng.choice(list(kinds)), rng.choice(values))
+            candidates = [value_2 for value_2 in values
+                          if value_2 != value_1 and kinds[kind](hidden[value_1], hidden[value_2])]
+            if candidates:
+                clues.append((kind, value_1, rng.choice(candidates)))
+                added += 1
+
+
+if __name__ == '__main__':
+    # The scholarship problem (see FD_Examples/scholarship_problem_FD.py) as a grid.
+    grid = Logic_Grid({'student': ['Ada', 'Emmy', 'Lynn', 'Marie'], 'major': ['Bio', 'CS', 'Math', 'Phys']})
+    grid.before('Phys', 'Emmy')
+    grid.different('Emmy', 'CS')
+    grid.different('Emmy', 'Phys')
+    grid.immediately_before('Lynn', 'CS')
+    grid.offset('Lynn', 'Marie', 2)
+    grid.before('Bio', 'Ada')
+    for solution in grid.solutions():
+        print('Scholarships: ' + '; '.join(f'${25 + 5*p},000: {row["student"]}/{row["major"]}'
+                                           for (p, row) in enumerate(solution)))
+
+    for (n_attributes, n) in [(5, 5), (10, 10)]:
+        start = perf_counter()
+        (grid, hidden) = random_grid_puzzle(n_attributes, n, seed=n)
+        built = perf_counter() - start
+        start = perf_counter()
+        [solution] = list(grid.solutions())
+        seconds = perf_counter() - start
+        assert all(solution[p][grid.attribute_of[value]] == value for (value, p) in hidden.items())
+        print(f'\nA random {n_attributes}x{n} puzzle with {len(grid.clues)} clues (generated in {built:.1f} seconds) '
+              f'solved in {seconds * 1000:.0f} milliseconds.')